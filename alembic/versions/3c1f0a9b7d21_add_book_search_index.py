@@ -0,0 +1,83 @@
+"""Add book full-text search index
+
+Revision ID: 3c1f0a9b7d21
+Revises: 6913ce722f62
+Create Date: 2026-10-18 10:12:41.207315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c1f0a9b7d21"
+down_revision: Union[str, None] = "6913ce722f62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            """
+            ALTER TABLE books ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(author, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(summary, '')), 'C')
+            ) STORED
+            """
+        )
+        op.execute(
+            "CREATE INDEX ix_books_search_vector ON books USING gin (search_vector)"
+        )
+        return
+
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE books_fts USING fts5(
+            title, author, summary, content='books', content_rowid='id'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, summary)
+            VALUES (new.id, new.title, new.author, new.summary);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, summary)
+            VALUES ('delete', old.id, old.title, old.author, old.summary);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_fts_au
+        AFTER UPDATE OF title, author, summary ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, summary)
+            VALUES ('delete', old.id, old.title, old.author, old.summary);
+            INSERT INTO books_fts(rowid, title, author, summary)
+            VALUES (new.id, new.title, new.author, new.summary);
+        END
+        """
+    )
+    op.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_books_search_vector")
+        op.execute("ALTER TABLE books DROP COLUMN search_vector")
+        return
+
+    op.execute("DROP TRIGGER books_fts_au")
+    op.execute("DROP TRIGGER books_fts_ad")
+    op.execute("DROP TRIGGER books_fts_ai")
+    op.execute("DROP TABLE books_fts")
@@ -0,0 +1,30 @@
+"""Add book version column
+
+Revision ID: 8a4e2d6c5b10
+Revises: 3c1f0a9b7d21
+Create Date: 2026-10-18 13:47:05.918224
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4e2d6c5b10"
+down_revision: Union[str, None] = "3c1f0a9b7d21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "books",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("books", "version")
@@ -0,0 +1,166 @@
+"""Drop per-facet book counts that every write contended on
+
+Revision ID: 9d27c4b8e610
+Revises: f1b6c08d3a57
+Create Date: 2026-10-19 16:02:11.518204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d27c4b8e610"
+down_revision: Union[str, None] = "f1b6c08d3a57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_DECADE = (
+    "coalesce(CAST(substr({row}.published_date, 1, 4) AS INTEGER) / 10 * 10, -1)"
+)
+POSTGRES_DECADE = (
+    "coalesce(CAST(date_part('year', {row}.published_date) AS INTEGER) / 10 * 10, -1)"
+)
+
+
+def facet_values(row: str, decade: str) -> dict:
+    return {
+        "genre": f"coalesce({row}.genre, '')",
+        "author": f"coalesce({row}.author, '')",
+        "decade": f"CAST({decade.format(row=row)} AS VARCHAR)",
+    }
+
+
+def bucket_of(row: str, decade: str) -> str:
+    return (
+        f"genre = coalesce({row}.genre, '') "
+        f"AND author = coalesce({row}.author, '') "
+        f"AND decade = {decade.format(row=row)}"
+    )
+
+
+def increment(row: str, decade: str, totals: bool) -> str:
+    statements = [
+        f"""
+        INSERT INTO book_facet_counts (genre, author, decade, count)
+        VALUES (
+            coalesce({row}.genre, ''),
+            coalesce({row}.author, ''),
+            {decade.format(row=row)},
+            1
+        )
+        ON CONFLICT (genre, author, decade)
+        DO UPDATE SET count = book_facet_counts.count + 1;"""
+    ]
+    if totals:
+        statements += [
+            f"""
+        INSERT INTO book_facet_totals (facet, value, count)
+        VALUES ('{facet}', {value}, 1)
+        ON CONFLICT (facet, value)
+        DO UPDATE SET count = book_facet_totals.count + 1;"""
+            for facet, value in facet_values(row, decade).items()
+        ]
+    return "".join(statements)
+
+
+def decrement(row: str, decade: str, totals: bool) -> str:
+    bucket = bucket_of(row, decade)
+    statements = [
+        f"""
+        UPDATE book_facet_counts SET count = count - 1 WHERE {bucket};
+        DELETE FROM book_facet_counts WHERE {bucket} AND count <= 0;"""
+    ]
+    if totals:
+        statements += [
+            f"""
+        UPDATE book_facet_totals SET count = count - 1
+        WHERE facet = '{facet}' AND value = {value};
+        DELETE FROM book_facet_totals
+        WHERE facet = '{facet}' AND value = {value} AND count <= 0;"""
+            for facet, value in facet_values(row, decade).items()
+        ]
+    return "".join(statements)
+
+
+def create_triggers(totals: bool) -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION book_facet_counts_sync() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    {decrement("OLD", POSTGRES_DECADE, totals)}
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    {increment("NEW", POSTGRES_DECADE, totals)}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        return
+
+    for name in (
+        "book_facet_counts_ai",
+        "book_facet_counts_ad",
+        "book_facet_counts_au",
+    ):
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute(
+        f"""
+        CREATE TRIGGER book_facet_counts_ai AFTER INSERT ON books BEGIN
+            {increment("new", SQLITE_DECADE, totals)}
+        END
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER book_facet_counts_ad AFTER DELETE ON books BEGIN
+            {decrement("old", SQLITE_DECADE, totals)}
+        END
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER book_facet_counts_au
+        AFTER UPDATE OF genre, author, published_date ON books BEGIN
+            {decrement("old", SQLITE_DECADE, totals)}
+            {increment("new", SQLITE_DECADE, totals)}
+        END
+        """
+    )
+
+
+def upgrade() -> None:
+    create_triggers(totals=False)
+    op.execute("DROP TABLE book_facet_totals")
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE book_facet_totals (
+            facet VARCHAR NOT NULL,
+            value VARCHAR NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (facet, value)
+        )
+        """
+    )
+    is_postgres = op.get_bind().dialect.name == "postgresql"
+    if is_postgres:
+        # Keep writes out until the table is filled and the trigger updated
+        op.execute("LOCK TABLE books IN SHARE MODE")
+    create_triggers(totals=True)
+
+    decade = POSTGRES_DECADE if is_postgres else SQLITE_DECADE
+    for facet, value in facet_values("books", decade).items():
+        op.execute(
+            f"""
+            INSERT INTO book_facet_totals (facet, value, count)
+            SELECT '{facet}', {value}, count(*) FROM books GROUP BY 2
+            """
+        )
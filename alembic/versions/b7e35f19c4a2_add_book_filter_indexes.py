@@ -0,0 +1,43 @@
+"""Add composite indexes for book filters and sorting
+
+Revision ID: b7e35f19c4a2
+Revises: 8a4e2d6c5b10
+Create Date: 2026-10-18 21:12:40.316508
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e35f19c4a2"
+down_revision: Union[str, None] = "8a4e2d6c5b10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_books_title_id": ["title", "id"],
+    "ix_books_published_date_id": ["published_date", "id"],
+    "ix_books_author_id": ["author", "id"],
+    "ix_books_author_title_id": ["author", "title", "id"],
+    "ix_books_author_published_date_id": ["author", "published_date", "id"],
+    "ix_books_genre_id": ["genre", "id"],
+    "ix_books_genre_title_id": ["genre", "title", "id"],
+    "ix_books_genre_published_date_id": ["genre", "published_date", "id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "books", columns, unique=False)
+    # Covered by the composite indexes that start with the same column
+    op.drop_index("ix_books_title", table_name="books")
+    op.drop_index("ix_books_author", table_name="books")
+
+
+def downgrade() -> None:
+    op.create_index("ix_books_author", "books", ["author"], unique=False)
+    op.create_index("ix_books_title", "books", ["title"], unique=False)
+    for name in reversed(list(INDEXES)):
+        op.drop_index(name, table_name="books")
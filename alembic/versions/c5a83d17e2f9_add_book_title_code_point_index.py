@@ -0,0 +1,30 @@
+"""Add a code point ordered title index for prefix filters on PostgreSQL
+
+Revision ID: c5a83d17e2f9
+Revises: e4d92a7c1f36
+Create Date: 2026-10-19 09:41:07.218334
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5a83d17e2f9"
+down_revision: Union[str, None] = "e4d92a7c1f36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite's default collation already orders by code point
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            'CREATE INDEX ix_books_title_c_id ON books ((title COLLATE "C"), id)'
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_books_title_c_id")
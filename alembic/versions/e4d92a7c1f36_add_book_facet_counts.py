@@ -0,0 +1,153 @@
+"""Add trigger-maintained book facet counts
+
+Revision ID: e4d92a7c1f36
+Revises: b7e35f19c4a2
+Create Date: 2026-10-18 22:03:18.552907
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4d92a7c1f36"
+down_revision: Union[str, None] = "b7e35f19c4a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_DECADE = (
+    "coalesce(CAST(substr({row}.published_date, 1, 4) AS INTEGER) / 10 * 10, -1)"
+)
+POSTGRES_DECADE = (
+    "coalesce(CAST(date_part('year', {row}.published_date) AS INTEGER) / 10 * 10, -1)"
+)
+
+
+def bucket_of(row: str, decade: str) -> str:
+    return (
+        f"genre = coalesce({row}.genre, '') "
+        f"AND author = coalesce({row}.author, '') "
+        f"AND decade = {decade.format(row=row)}"
+    )
+
+
+def sqlite_increment(row: str) -> str:
+    return f"""
+        INSERT INTO book_facet_counts (genre, author, decade, count)
+        VALUES (
+            coalesce({row}.genre, ''),
+            coalesce({row}.author, ''),
+            {SQLITE_DECADE.format(row=row)},
+            1
+        )
+        ON CONFLICT (genre, author, decade) DO UPDATE SET count = count + 1;
+        """
+
+
+def sqlite_decrement(row: str) -> str:
+    bucket = bucket_of(row, SQLITE_DECADE)
+    return f"""
+        UPDATE book_facet_counts SET count = count - 1 WHERE {bucket};
+        DELETE FROM book_facet_counts WHERE {bucket} AND count <= 0;
+        """
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE book_facet_counts (
+            genre VARCHAR NOT NULL,
+            author VARCHAR NOT NULL,
+            decade INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (genre, author, decade)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX ix_book_facet_counts_author ON book_facet_counts (author, decade)"
+    )
+
+    if op.get_bind().dialect.name == "postgresql":
+        decade = POSTGRES_DECADE
+        op.execute(
+            f"""
+            CREATE FUNCTION book_facet_counts_sync() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    UPDATE book_facet_counts SET count = count - 1
+                    WHERE {bucket_of("OLD", POSTGRES_DECADE)};
+                    DELETE FROM book_facet_counts
+                    WHERE {bucket_of("OLD", POSTGRES_DECADE)} AND count <= 0;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO book_facet_counts (genre, author, decade, count)
+                    VALUES (
+                        coalesce(NEW.genre, ''),
+                        coalesce(NEW.author, ''),
+                        {POSTGRES_DECADE.format(row="NEW")},
+                        1
+                    )
+                    ON CONFLICT (genre, author, decade)
+                    DO UPDATE SET count = book_facet_counts.count + 1;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER book_facet_counts_sync
+            AFTER INSERT OR DELETE OR UPDATE OF genre, author, published_date
+            ON books FOR EACH ROW EXECUTE FUNCTION book_facet_counts_sync()
+            """
+        )
+    else:
+        decade = SQLITE_DECADE
+        op.execute(
+            f"""
+            CREATE TRIGGER book_facet_counts_ai AFTER INSERT ON books BEGIN
+                {sqlite_increment("new")}
+            END
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER book_facet_counts_ad AFTER DELETE ON books BEGIN
+                {sqlite_decrement("old")}
+            END
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER book_facet_counts_au
+            AFTER UPDATE OF genre, author, published_date ON books BEGIN
+                {sqlite_decrement("old")}
+                {sqlite_increment("new")}
+            END
+            """
+        )
+
+    op.execute(
+        f"""
+        INSERT INTO book_facet_counts (genre, author, decade, count)
+        SELECT coalesce(genre, ''), coalesce(author, ''),
+               {decade.format(row="books")}, count(*)
+        FROM books
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TRIGGER book_facet_counts_sync ON books")
+        op.execute("DROP FUNCTION book_facet_counts_sync()")
+    else:
+        op.execute("DROP TRIGGER book_facet_counts_au")
+        op.execute("DROP TRIGGER book_facet_counts_ad")
+        op.execute("DROP TRIGGER book_facet_counts_ai")
+    op.execute("DROP INDEX ix_book_facet_counts_author")
+    op.execute("DROP TABLE book_facet_counts")
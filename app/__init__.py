@@ -1 +1,6 @@
 """Book Management API package."""
+
+import time
+
+# Taken as early as possible so the startup time includes importing the app
+IMPORT_STARTED = time.perf_counter()
@@ -1,11 +1,17 @@
 from datetime import timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app.core.config import settings
-from app.core.security import create_access_token, verify_password
-from app.database.database import get_db
+from app.core.security import create_access_token, password_hasher
+from app.database.database import (
+    get_async_sessionmaker,
+    get_read_sessionmaker,
+    mark_written,
+)
+from app.database.profiling import QueryBudget
 from app.models.user import User
 from app.schemas.token import Token
 from app.schemas.user import Login
@@ -13,16 +19,37 @@ from app.schemas.user import Login
 router = APIRouter()
 
 
-@router.post("/login", response_model=Token)
-def login(login_data: Login, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == login_data.username).first()
-    if not user or not verify_password(login_data.password, user.hashed_password):
+@router.post("/login", response_model=Token, dependencies=[Depends(QueryBudget(2))])
+async def login(
+    login_data: Login,
+    request: Request,
+    session_factory: async_sessionmaker = Depends(get_async_sessionmaker),
+):
+    # A user who just signed up is read back from the primary
+    read_session_factory = get_read_sessionmaker(request, session_factory)
+    async with read_session_factory() as db:
+        user = await db.scalar(select(User).where(User.username == login_data.username))
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(
+            login_data.password, user.hashed_password
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Transparently upgrade hashes made with an outdated work factor
+    if new_hash:
+        async with session_factory() as db:
+            await db.execute(
+                update(User).where(User.id == user.id).values(hashed_password=new_hash)
+            )
+            await db.commit()
+        mark_written()
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -1,24 +1,262 @@
-import asyncio
 import json
+import sys
+from datetime import date
+from typing import Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from sqlalchemy import delete, func, insert, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
+from app.core.cache import book_cache
+from app.core.conditional import book_etag, etag_matches, page_etag
+from app.core.config import settings
 from app.core.events import event_manager
+from app.core.pagination import InvalidCursor, decode_cursor, encode_cursor
 from app.core.security import get_current_user
-from app.database.database import get_db
+from app.core.serialization import (
+    encode_book,
+    encode_book_batch,
+    encode_paginated_books,
+    json_response,
+)
+from app.core.streaming import (
+    InvalidLine,
+    encode_csv,
+    encode_ndjson,
+    gzip_stream,
+    iter_csv_dicts,
+    iter_lines,
+)
+from app.database.database import (
+    get_async_db,
+    get_async_read_db,
+    get_async_sessionmaker,
+    get_read_sessionmaker,
+    mark_written,
+)
+from app.database.facets import book_facets
+from app.database.profiling import QueryBudget
+from app.database.search import search_books
 from app.models.book import Book
 from app.schemas.book import Book as BookSchema
-from app.schemas.book import BookCreate, BookUpdate, PaginatedBooks
+from app.schemas.book import (
+    BookBatch,
+    BookBatchGet,
+    BookBulkUpdate,
+    BookCreate,
+    BookFacets,
+    BookFilter,
+    BookPatch,
+    BookSort,
+    BulkImportError,
+    BulkImportResult,
+    ExportFormat,
+    BookSearchResults,
+    BookSelection,
+    BulkChangeResult,
+    PaginatedBooks,
+    TotalMode,
+)
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
 
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def check_if_match(if_match: Optional[str], book: Book):
+    if if_match is not None and not etag_matches(if_match, book_etag(book), weak=False):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Book has been modified",
+        )
+
+
+async def commit_versioned(db: AsyncSession):
+    """Commit, turning a concurrent change to the same row into a 412."""
+    try:
+        await db.commit()
+    except StaleDataError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Book has been modified",
+        )
+
+
+def book_filter(
+    author: Optional[str] = Query(None, description="Only books by this author"),
+    genre: Optional[str] = Query(None, description="Only books in this genre"),
+    published_from: Optional[date] = Query(
+        None, description="Only books published on or after this date"
+    ),
+    published_to: Optional[date] = Query(
+        None, description="Only books published on or before this date"
+    ),
+    title_prefix: Optional[str] = Query(
+        None, min_length=1, description="Only books whose title starts with this"
+    ),
+) -> BookFilter:
+    return BookFilter(
+        author=author,
+        genre=genre,
+        published_from=published_from,
+        published_to=published_to,
+        title_prefix=title_prefix,
+    )
+
+
+def filter_conditions(filters: BookFilter, dialect_name: str) -> list:
+    conditions = []
+    if filters.author is not None:
+        conditions.append(Book.author == filters.author)
+    if filters.genre is not None:
+        conditions.append(Book.genre == filters.genre)
+    if filters.published_from is not None:
+        conditions.append(Book.published_date >= filters.published_from)
+    if filters.published_to is not None:
+        conditions.append(Book.published_date <= filters.published_to)
+    if filters.title_prefix is not None:
+        # The titles starting with the prefix form one range only in code
+        # point order: SQLite's default BINARY collation, or "C" on
+        # PostgreSQL (served by ix_books_title_c_id). LIKE also covers the
+        # range left open when the prefix ends in the last code point.
+        prefix = filters.title_prefix
+        title = Book.title.collate("C") if dialect_name == "postgresql" else Book.title
+        conditions.append(title >= prefix)
+        if ord(prefix[-1]) < sys.maxunicode:
+            conditions.append(title < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        conditions.append(Book.title.startswith(prefix, autoescape=True))
+    return conditions
+
+
+def selection_conditions(selection: BookSelection, dialect_name: str) -> list:
+    """Conditions matching `selection`, refusing one that would match every book."""
+    conditions = []
+    if selection.filter is not None:
+        conditions = filter_conditions(selection.filter, dialect_name)
+    if selection.ids is not None:
+        if len(selection.ids) > settings.BULK_CHANGE_MAX_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"At most {settings.BULK_CHANGE_MAX_IDS} ids per request",
+            )
+        conditions.append(Book.id.in_(selection.ids))
+    if not conditions:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Select books with `ids` or at least one filter",
+        )
+    return conditions
+
+
+async def bulk_change_conditions(db: AsyncSession, selection: BookSelection) -> list:
+    """`selection_conditions`, narrowed to at most `BULK_CHANGE_MAX_ROWS` books.
+
+    Selections by ids are already bounded; a filter alone could match the
+    whole table in one statement, so its matches are fetched (one past the
+    limit) and refused when there are too many.
+    """
+    conditions = selection_conditions(selection, db.bind.dialect.name)
+    if selection.ids is not None:
+        return conditions
+    limit = settings.BULK_CHANGE_MAX_ROWS
+    ids = (await db.scalars(select(Book.id).where(*conditions).limit(limit + 1))).all()
+    if len(ids) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"The filter matches more than {limit} books; narrow it",
+        )
+    return [*conditions, Book.id.in_(ids)]
+
+
+def sort_key(sort: BookSort, code_point_titles: bool = False):
+    """Return the sort column and whether the order is descending.
+
+    With `code_point_titles`, titles sort in code point order ("C"
+    collation), the order ix_books_title_c_id keeps on PostgreSQL.
+    """
+    descending = sort.value.startswith("-")
+    column = getattr(Book, sort.value.lstrip("-"))
+    if code_point_titles and column is Book.title:
+        column = Book.title.collate("C")
+    return column, descending
+
+
+def code_point_titles(filters: BookFilter, dialect_name: str) -> bool:
+    """Whether a title sort should use the collation of the title prefix range."""
+    return dialect_name == "postgresql" and filters.title_prefix is not None
+
+
+def encode_position(book: Book, sort: BookSort) -> str:
+    column, _ = sort_key(sort)
+    if sort == BookSort.id:
+        return encode_cursor({"id": book.id})
+    if column is Book.id:
+        return encode_cursor({"id": book.id, "sort": sort.value})
+    value = getattr(book, column.key)
+    if isinstance(value, date):
+        value = value.isoformat()
+    return encode_cursor({"id": book.id, "sort": sort.value, "key": value})
+
+
+def after_position(cursor: str, sort: BookSort, code_point_titles: bool = False):
+    """Build the keyset condition for the rows after `cursor` in `sort` order."""
+    position = decode_cursor(cursor)
+    if position.get("sort", BookSort.id.value) != sort.value:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    column, descending = sort_key(sort, code_point_titles)
+    if column is Book.id:
+        key, last = Book.id, position["id"]
+    else:
+        value = position.get("key")
+        if not isinstance(value, str):
+            raise InvalidCursor("Invalid cursor")
+        if column is Book.published_date:
+            try:
+                value = date.fromisoformat(value)
+            except ValueError:
+                raise InvalidCursor("Invalid cursor")
+        key, last = tuple_(column, Book.id), (value, position["id"])
+    return key < last if descending else key > last
+
+
+async def count_books(
+    db: AsyncSession, mode: TotalMode, conditions: list = ()
+) -> Optional[int]:
+    if mode == TotalMode.none:
+        return None
+    if mode == TotalMode.estimate and not conditions:
+        if db.bind.dialect.name == "postgresql":
+            # Planner statistics instead of a full scan; -1 until first ANALYZE
+            estimate = await db.scalar(
+                text("SELECT reltuples FROM pg_class WHERE oid = 'books'::regclass")
+            )
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        elif db.bind.dialect.name == "sqlite":
+            # COUNT(*) walks the whole table on SQLite; the largest id is one
+            # rowid b-tree seek and overcounts only by the deleted books
+            return await db.scalar(select(func.coalesce(func.max(Book.id), 0)))
+    return await db.scalar(select(func.count()).select_from(Book).where(*conditions))
+
+
 @router.get("/stream")
-async def stream_books():
+async def stream_books(last_event_id: Optional[str] = Header(None)):
     return StreamingResponse(
-        event_manager.subscribe(),
+        event_manager.subscribe(last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -27,85 +265,450 @@ async def stream_books():
     )
 
 
-@router.get("/", response_model=PaginatedBooks)
+@router.get("/stream/stats")
+async def stream_stats():
+    return event_manager.stats()
+
+
+@router.get("/export")
+async def export_books(
+    request: Request,
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    compress: bool = Query(False, alias="gzip", description="Gzip the body"),
+    session_factory=Depends(get_async_sessionmaker),
+):
+    """Stream the whole catalog as NDJSON or CSV.
+
+    Rows are read in one transaction through a server-side cursor, so the
+    export is a single consistent snapshot and is never held in memory.
+    """
+    columns = [
+        column
+        for column in Book.__table__.columns
+        if column.name in BookSchema.model_fields
+    ]
+
+    session_factory = get_read_sessionmaker(request, session_factory)
+
+    async def generate():
+        async with session_factory() as db:
+            if db.bind.dialect.name == "postgresql":
+                await db.connection(
+                    execution_options={
+                        "isolation_level": "REPEATABLE READ",
+                        "postgresql_readonly": True,
+                    }
+                )
+            result = await db.stream(
+                select(*columns)
+                .order_by(Book.id)
+                .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+            )
+            if export_format == ExportFormat.csv:
+                yield encode_csv([[column.name for column in columns]])
+            async for rows in result.partitions():
+                if export_format == ExportFormat.csv:
+                    yield encode_csv(rows)
+                else:
+                    yield encode_ndjson(row._asdict() for row in rows)
+
+    if export_format == ExportFormat.csv:
+        media_type, filename = "text/csv", "books.csv"
+    else:
+        media_type, filename = "application/x-ndjson", "books.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    body = generate()
+    if compress:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@router.get(
+    "/search", response_model=BookSearchResults, dependencies=[Depends(QueryBudget(1))]
+)
+async def search(
+    q: str = Query(..., min_length=1, description="Words to look for"),
+    skip: int = Query(0, ge=0, description="Skip N records"),
+    limit: int = Query(20, ge=1, le=100, description="Limit to N records"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    books = await search_books(db, q, skip=skip, limit=limit)
+    return BookSearchResults(query=q, skip=skip, limit=limit, books=books)
+
+
+@router.get(
+    "/facets", response_model=BookFacets, dependencies=[Depends(QueryBudget(4))]
+)
+async def facets(
+    limit: int = Query(20, ge=1, le=100, description="Buckets per facet"),
+    filters: BookFilter = Depends(book_filter),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Count books per genre, author and decade, largest buckets first.
+
+    Takes the same filters as `GET /books/`. Missing values are counted
+    under `null`.
+    """
+    return await book_facets(
+        db, filters, filter_conditions(filters, db.bind.dialect.name), limit
+    )
+
+
+@router.get("/", response_model=PaginatedBooks, dependencies=[Depends(QueryBudget(2))])
 async def list_books(
     skip: int = Query(0, ge=0, description="Skip N records"),
     limit: int = Query(20, ge=1, le=100, description="Limit to N records"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(
+        None, description="Continue after the `next_cursor` of a previous page"
+    ),
+    total_mode: TotalMode = Query(
+        TotalMode.exact, alias="total", description="How to compute `total`"
+    ),
+    sort: BookSort = Query(
+        BookSort.id, description="Sort key; prefix with `-` for descending order"
+    ),
+    filters: BookFilter = Depends(book_filter),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    total = db.query(Book).count()
-    books = db.query(Book).offset(skip).limit(limit).all()
-    return PaginatedBooks(books=books, total=total, skip=skip, limit=limit)
+    conditions = filter_conditions(filters, db.bind.dialect.name)
+    total = await count_books(db, total_mode, conditions)
+
+    # Ties on the sort key are broken by id, matching the composite indexes
+    code_points = code_point_titles(filters, db.bind.dialect.name)
+    column, descending = sort_key(sort, code_points)
+    order = [column.desc(), Book.id.desc()] if descending else [column, Book.id]
+    if column is Book.id:
+        order = order[:1]
+    query = select(Book).where(*conditions).order_by(*order)
+    if cursor is not None:
+        # Keyset mode: seek past the last row seen instead of scanning `skip` rows
+        try:
+            query = query.where(after_position(cursor, sort, code_points))
+        except InvalidCursor as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+            )
+        skip = 0
+    else:
+        query = query.offset(skip)
 
+    # Fetch one extra row to know whether another page exists
+    books = (await db.scalars(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_position(books[-1], sort)
+
+    etag = page_etag(books, total, next_cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return json_response(
+        encode_paginated_books(
+            books=books, total=total, skip=skip, limit=limit, next_cursor=next_cursor
+        ),
+        headers={"ETag": etag},
+    )
+
+
+@router.get(
+    "/{book_id}", response_model=BookSchema, dependencies=[Depends(QueryBudget(1))]
+)
+async def get_book(
+    book_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    cached = book_cache.get(book_id)
+    if cached is not None:
+        etag, book_json = cached
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return json_response(book_json, headers={"ETag": etag})
 
-@router.get("/{book_id}", response_model=BookSchema)
-async def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).filter(Book.id == book_id).first()
+    generation = book_cache.generation()
+    book = await db.get(Book, book_id)
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Book with id {book_id} not found",
         )
-    return book
+    etag = book_etag(book)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    book_json = encode_book(book)
+    # A write committed during the lookup wins over what was read
+    book_cache.set_if_unchanged(book_id, (etag, book_json), generation)
+    return json_response(book_json, headers={"ETag": etag})
 
 
-@router.post("/", response_model=BookSchema)
+@router.post(
+    "/batch-get", response_model=BookBatch, dependencies=[Depends(QueryBudget(1))]
+)
+async def batch_get_books(
+    request: BookBatchGet, db: AsyncSession = Depends(get_async_read_db)
+):
+    """Fetch many books by id in one request.
+
+    Books are returned in the order of `ids` (duplicates once), and ids with
+    no book are listed in `missing`. Cached books are served from the cache;
+    the rest are loaded with a single query.
+    """
+    ids = list(dict.fromkeys(request.ids))
+    if len(ids) > settings.BATCH_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.BATCH_GET_MAX_IDS} ids per request",
+        )
+
+    found = {}
+    for book_id in ids:
+        cached = book_cache.get(book_id)
+        if cached is not None:
+            found[book_id] = cached[1]
+    misses = [book_id for book_id in ids if book_id not in found]
+    if misses:
+        generation = book_cache.generation()
+        for book in await db.scalars(select(Book).where(Book.id.in_(misses))):
+            book_json = encode_book(book)
+            book_cache.set_if_unchanged(
+                book.id, (book_etag(book), book_json), generation
+            )
+            found[book.id] = book_json
+
+    return json_response(
+        encode_book_batch(
+            [found[book_id] for book_id in ids if book_id in found],
+            [book_id for book_id in ids if book_id not in found],
+        )
+    )
+
+
+@router.post("/", response_model=BookSchema, dependencies=[Depends(QueryBudget(2))])
 async def create_book(
     book: BookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_book = Book(**book.dict())
+    db_book = Book(**book.model_dump())
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    mark_written()
+    await db.refresh(db_book)
 
-    # Convert the book to a dict and ensure the date is serializable
-    book_data = BookSchema.from_orm(db_book).dict()
-    book_data["published_date"] = book_data["published_date"].isoformat()
+    # Encode once for the cache, the broadcast and the response
+    etag, book_json = book_etag(db_book), encode_book(db_book)
+    book_cache.set(db_book.id, (etag, book_json))
 
     # Broadcast the new book to all connected clients
-    asyncio.create_task(
-        event_manager.broadcast(
-            json.dumps({"event": "book_created", "data": book_data})
+    await event_manager.publish_change("book_created", db_book.id, book_json.decode())
+
+    return json_response(book_json, headers={"ETag": etag})
+
+
+def validate_import_row(row: Union[str, dict]) -> BookCreate:
+    if isinstance(row, str):
+        return BookCreate.model_validate_json(row)
+    return BookCreate.model_validate(row)
+
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def import_books(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Import books from an NDJSON (default) or CSV (`text/csv`) request body.
+
+    The body is read as a stream and written in batches of
+    `BULK_IMPORT_BATCH_SIZE` rows, one multi-row INSERT and one commit each.
+    Invalid rows are skipped and reported; the rest are imported.
+    """
+    max_line_bytes = settings.BULK_IMPORT_MAX_LINE_BYTES
+    lines = iter_lines(request.stream(), max_line_bytes)
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        rows = iter_csv_dicts(lines, max_line_bytes)
+    else:
+        rows = (
+            line
+            async for line in lines
+            if isinstance(line, InvalidLine) or line.strip()
+        )
+
+    inserted = failed = row_number = 0
+    errors = []
+    batch = []
+
+    async def flush():
+        nonlocal inserted
+        await db.execute(insert(Book).values(batch))
+        await db.commit()
+        mark_written()
+        inserted += len(batch)
+        batch.clear()
+
+    async for row in rows:
+        row_number += 1
+        if isinstance(row, InvalidLine):
+            messages = [f"row: {row.reason}"]
+        else:
+            try:
+                batch.append(validate_import_row(row).model_dump())
+            except ValidationError as exc:
+                messages = [
+                    f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}"
+                    for error in exc.errors()
+                ]
+            else:
+                if len(batch) >= settings.BULK_IMPORT_BATCH_SIZE:
+                    await flush()
+                continue
+        failed += 1
+        if len(errors) < settings.BULK_IMPORT_MAX_ERRORS:
+            errors.append(BulkImportError(row=row_number, errors=messages))
+    if batch:
+        await flush()
+
+    # One summary event instead of one per imported book
+    if inserted:
+        await event_manager.broadcast(
+            json.dumps({"event": "books_imported", "data": {"count": inserted}})
+        )
+
+    return BulkImportResult(inserted=inserted, failed=failed, errors=errors)
+
+
+@router.post(
+    "/bulk-update",
+    response_model=BulkChangeResult,
+    dependencies=[Depends(QueryBudget(2))],
+)
+async def bulk_update_books(
+    request: BookBulkUpdate,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Apply one patch to every selected book with a single UPDATE.
+
+    Each changed book gets a new version, so earlier ETags stop matching.
+    Emits one `books_updated` event with the ids and the patch.
+    """
+    changes = request.patch.model_dump(exclude_unset=True)
+    if not changes:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The patch doesn't change any field",
         )
+    result = await db.execute(
+        update(Book)
+        .where(*await bulk_change_conditions(db, request))
+        .values(**changes, version=Book.version + 1)
+        .returning(Book.id)
+        .execution_options(synchronize_session=False)
+    )
+    ids = sorted(result.scalars())
+    await db.commit()
+    if not ids:
+        return BulkChangeResult(count=0, ids=[])
+
+    mark_written()
+    for book_id in ids:
+        book_cache.delete(book_id)
+    data = {
+        "count": len(ids),
+        "ids": ids,
+        "changes": request.patch.model_dump(mode="json", exclude_unset=True),
+    }
+    # Send queued single-book changes first, so none of them lands after this
+    await event_manager.flush()
+    await event_manager.broadcast(json.dumps({"event": "books_updated", "data": data}))
+    return BulkChangeResult(count=len(ids), ids=ids)
+
+
+@router.post(
+    "/bulk-delete",
+    response_model=BulkChangeResult,
+    dependencies=[Depends(QueryBudget(2))],
+)
+async def bulk_delete_books(
+    request: BookSelection,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Delete every selected book with a single DELETE.
+
+    Emits one `books_deleted` event with the ids.
+    """
+    result = await db.execute(
+        delete(Book)
+        .where(*await bulk_change_conditions(db, request))
+        .returning(Book.id)
+        .execution_options(synchronize_session=False)
     )
+    ids = sorted(result.scalars())
+    await db.commit()
+    if not ids:
+        return BulkChangeResult(count=0, ids=[])
 
-    return db_book
+    mark_written()
+    for book_id in ids:
+        book_cache.delete(book_id)
+    data = {"count": len(ids), "ids": ids}
+    # Send queued single-book changes first, so none of them lands after this
+    await event_manager.flush()
+    await event_manager.broadcast(json.dumps({"event": "books_deleted", "data": data}))
+    return BulkChangeResult(count=len(ids), ids=ids)
 
 
-@router.patch("/{book_id}", response_model=BookSchema)
+@router.patch(
+    "/{book_id}", response_model=BookSchema, dependencies=[Depends(QueryBudget(3))]
+)
 async def update_book(
     book_id: int,
-    book_update: BookUpdate,
-    db: Session = Depends(get_db),
+    book_update: BookPatch,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     if not db_book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Book with id {book_id} not found",
         )
+    check_if_match(if_match, db_book)
 
     # Update only the fields that are provided
     for field, value in book_update.model_dump(exclude_unset=True).items():
         setattr(db_book, field, value)
 
-    db.commit()
-    db.refresh(db_book)
-    return db_book
+    await commit_versioned(db)
+    mark_written()
+    await db.refresh(db_book)
+    etag, book_json = book_etag(db_book), encode_book(db_book)
+    book_cache.set(book_id, (etag, book_json))
+    await event_manager.publish_change("book_updated", book_id, book_json.decode())
+    return json_response(book_json, headers={"ETag": etag})
 
 
-@router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{book_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(QueryBudget(2))],
+)
 async def delete_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     if not db_book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Book not found"
         )
+    check_if_match(if_match, db_book)
 
-    db.delete(db_book)
-    db.commit()
+    await db.delete(db_book)
+    await commit_versioned(db)
+    mark_written()
+    book_cache.delete(book_id)
+    await event_manager.publish_change(
+        "book_deleted", book_id, json.dumps({"id": book_id})
+    )
     return None
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_password_hash
-from app.database.database import get_db
+from app.core.security import password_hasher
+from app.database.database import get_async_db, mark_written
+from app.database.profiling import QueryBudget
 from app.models.user import User
 from app.schemas.user import User as UserSchema
 from app.schemas.user import UserCreate
@@ -10,21 +12,22 @@ from app.schemas.user import UserCreate
 router = APIRouter()
 
 
-@router.post("/", response_model=UserSchema)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+@router.post("/", response_model=UserSchema, dependencies=[Depends(QueryBudget(4))])
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         email=user.email, username=user.username, hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    mark_written()
+    await db.refresh(db_user)
     return db_user
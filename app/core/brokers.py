@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    """Carries published messages to the EventManager of every worker.
+
+    `EventManager` sets `deliver` to its local fan-out; a broker calls it once
+    for every message published by any worker, including its own.
+    """
+
+    deliver: Callable[[str], None]
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, message: str):
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    """Single-process broker: messages never leave the worker."""
+
+    async def publish(self, message: str):
+        self.deliver(message)
+
+
+class PostgresBroker(Broker):
+    """Relays messages through PostgreSQL LISTEN/NOTIFY.
+
+    Works across processes and hosts sharing the database. NOTIFY payloads
+    must stay under 8000 bytes, so larger messages are stored in the
+    `book_event_payloads` table and only their row id is notified; rows are
+    pruned after `payload_ttl` seconds. Dropped connections are reopened,
+    though events published while the listener is away are lost.
+    """
+
+    NOTIFY_LIMIT = 7900  # bytes, leaving room for the channel name
+    REFERENCE_PREFIX = "@"  # event ids never start with it
+
+    def __init__(
+        self, dsn: str, channel: str = "book_events", payload_ttl: float = 300
+    ):
+        # asyncpg takes plain libpq URLs without a SQLAlchemy driver suffix
+        scheme, _, rest = dsn.partition("://")
+        self.dsn = f"{scheme.split('+')[0]}://{rest}"
+        self.channel = channel
+        self.payload_ttl = payload_ttl
+        self._listener = None
+        self._publisher = None
+        self._publish_lock = asyncio.Lock()
+        # Notifications are handled in order, fetching stored payloads inline
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._consumer: Optional[asyncio.Task] = None
+        self._reconnect: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        import asyncpg
+
+        self._stopping = False
+        self._publisher = await asyncpg.connect(self.dsn)
+        try:
+            await self._publisher.execute(
+                """
+                CREATE UNLOGGED TABLE IF NOT EXISTS book_event_payloads (
+                    id BIGSERIAL PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+        except asyncpg.UniqueViolationError:
+            pass  # Another worker created it at the same moment
+        await self._listen()
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        self._stopping = True
+        for task in (self._consumer, self._reconnect):
+            if task is not None:
+                task.cancel()
+        self._consumer = self._reconnect = None
+        for connection in (self._listener, self._publisher):
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        self._listener = self._publisher = None
+
+    async def _listen(self):
+        import asyncpg
+
+        listener = await asyncpg.connect(self.dsn)
+        listener.add_termination_listener(self._on_listener_lost)
+        await listener.add_listener(self.channel, self._on_notify)
+        self._listener = listener
+
+    def _on_listener_lost(self, connection):
+        if self._stopping or self._reconnect is not None:
+            return
+        logger.warning("Lost the event listener connection, reconnecting")
+        self._reconnect = asyncio.create_task(self._relisten())
+
+    async def _relisten(self):
+        delay = 0.5
+        try:
+            while not self._stopping:
+                try:
+                    await self._listen()
+                    logger.info("Event listener reconnected")
+                    return
+                except Exception as exc:
+                    logger.warning("Event listener reconnect failed: %s", exc)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+        finally:
+            self._reconnect = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._incoming.put_nowait(payload)
+
+    async def _consume(self):
+        while True:
+            payload = await self._incoming.get()
+            if payload.startswith(self.REFERENCE_PREFIX):
+                try:
+                    payload = await self._listener.fetchval(
+                        "SELECT payload FROM book_event_payloads WHERE id = $1",
+                        int(payload[len(self.REFERENCE_PREFIX) :]),
+                    )
+                except Exception:
+                    logger.exception("Could not load stored event %s", payload)
+                    continue
+                if payload is None:
+                    logger.warning("Stored event expired before it was read")
+                    continue
+            self.deliver(payload)
+
+    async def publish(self, message: str):
+        async with self._publish_lock:
+            try:
+                await self._notify(message)
+            except Exception as exc:
+                if self._publisher is not None and not self._publisher.is_closed():
+                    raise
+                # The connection dropped: retry once on a fresh one
+                import asyncpg
+
+                logger.warning("Event publisher reconnecting after: %s", exc)
+                self._publisher = await asyncpg.connect(self.dsn)
+                await self._notify(message)
+
+    async def _notify(self, message: str):
+        if self._publisher is None or self._publisher.is_closed():
+            raise ConnectionError("Event publisher is not connected")
+        if len(message.encode()) < self.NOTIFY_LIMIT:
+            await self._publisher.execute(
+                "SELECT pg_notify($1, $2)", self.channel, message
+            )
+            return
+        # NOTIFY is sent on commit, when the row is visible to the listeners
+        async with self._publisher.transaction():
+            await self._publisher.execute(
+                "DELETE FROM book_event_payloads "
+                "WHERE created_at < now() - make_interval(secs => $1)",
+                self.payload_ttl,
+            )
+            event_id = await self._publisher.fetchval(
+                "INSERT INTO book_event_payloads (payload) VALUES ($1) RETURNING id",
+                message,
+            )
+            await self._publisher.execute(
+                "SELECT pg_notify($1, $2)",
+                self.channel,
+                f"{self.REFERENCE_PREFIX}{event_id}",
+            )
+
+
+class _FrameReader(asyncio.Protocol):
+    """Splits a stream of length-prefixed frames into messages."""
+
+    def __init__(self, broker: "UnixSocketBroker"):
+        self.broker = broker
+        self.buffer = bytearray()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.broker._connections.add(transport)
+        # A worker that just started connects to everyone it finds
+        self.broker._refresh_peers()
+
+    def data_received(self, data: bytes):
+        self.buffer += data
+        while len(self.buffer) >= 4:
+            size = int.from_bytes(self.buffer[:4], "big")
+            if len(self.buffer) < 4 + size:
+                return
+            payload = bytes(self.buffer[4 : 4 + size])
+            del self.buffer[: 4 + size]
+            self.broker.deliver(payload.decode())
+
+    def connection_lost(self, exc):
+        self.broker._connections.discard(self.transport)
+        self.broker._refresh_peers()
+
+
+class UnixSocketBroker(Broker):
+    """Relays messages between worker processes on one host.
+
+    Every worker listens on a stream socket in `directory` and keeps a
+    connection to each socket found there, so messages of any size arrive
+    whole and in order. The list of sockets is refreshed whenever a worker
+    connects or disconnects.
+
+    `publish` only queues the message for each peer; a task per peer sends
+    it. A peer that falls `queue_size` messages behind, or doesn't read one
+    within `send_timeout` seconds, loses messages (logged) instead of
+    holding up the others. Sockets left behind by dead workers are removed
+    on the first failed connection.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: Optional[str] = None,
+        queue_size: int = 1000,
+        send_timeout: float = 5,
+    ):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name or os.getpid()}.sock")
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.BaseTransport] = set()
+        self._peers: Dict[str, Tuple[asyncio.Queue, asyncio.Task]] = {}
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.get_running_loop().create_unix_server(
+            lambda: _FrameReader(self), path=self.path
+        )
+        self._refresh_peers()
+
+    async def stop(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        server.close()
+        # Let connections accepted just now register before closing them all,
+        # so publishers see EOF instead of writing into a dead worker
+        await asyncio.sleep(0)
+        for transport in list(self._connections):
+            transport.close()
+        tasks = [task for _, task in self._peers.values()]
+        self._peers.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def publish(self, message: str):
+        payload = message.encode()
+        frame = len(payload).to_bytes(4, "big") + payload
+        for path, (queue, _) in self._peers.items():
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning("Dropped event for %s: too far behind", path)
+
+    def _refresh_peers(self):
+        """Start a writer for every new socket and stop those whose socket is gone."""
+        if self._server is None:
+            return
+        paths = {
+            entry.path
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".sock")
+        }
+        for path in paths - self._peers.keys():
+            queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+            self._peers[path] = (queue, asyncio.ensure_future(self._write(path, queue)))
+        for path in self._peers.keys() - paths:
+            _, task = self._peers.pop(path)
+            task.cancel()
+
+    async def _write(self, path: str, queue: asyncio.Queue):
+        """Send one peer its queued frames over a connection of its own."""
+        connection = None
+        try:
+            # Connecting straight away lets a new peer find this worker too
+            connection = await asyncio.open_unix_connection(path)
+            while True:
+                frame = await queue.get()
+                connection = await self._send(path, connection, frame)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Nobody is bound to it any more
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        except OSError as exc:
+            logger.warning("Lost connection to %s: %s", path, exc)
+        finally:
+            if connection is not None:
+                connection[1].close()
+            if self._peers.get(path, (None, None))[1] is asyncio.current_task():
+                del self._peers[path]
+
+    async def _send(self, path: str, connection: tuple, frame: bytes, retry=True):
+        reader, writer = connection
+        # Peers never send anything, so EOF means the worker went away
+        if writer.is_closing() or reader.at_eof():
+            writer.close()
+            connection = reader, writer = await asyncio.open_unix_connection(path)
+        try:
+            writer.write(frame)
+            await asyncio.wait_for(writer.drain(), self.send_timeout)
+        except asyncio.TimeoutError:
+            # Throw away what it hasn't read; the next frame reconnects
+            writer.transport.abort()
+            logger.warning("Dropped event for %s: not read in time", path)
+        except OSError as exc:
+            # A cached connection to a restarted worker: reconnect once
+            writer.close()
+            if not retry:
+                logger.warning("Dropped event for %s: %s", path, exc)
+                return connection
+            connection = await asyncio.open_unix_connection(path)
+            return await self._send(path, connection, frame, retry=False)
+        return connection
+
+
+def create_broker(name: str, url: str, socket_dir: str) -> Broker:
+    if name == "postgres":
+        return PostgresBroker(url)
+    if name == "unix":
+        return UnixSocketBroker(socket_dir)
+    return LocalBroker()
@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.core.config import settings
+
+
+class LRUCache:
+    """Bounded in-process cache with LRU eviction and per-entry expiry.
+
+    Entries live in one worker's memory, so other workers only see a change
+    once their own copy expires; keep the TTL short where that matters.
+
+    Readers that load a value across an `await` should take `generation()`
+    first and store with `set_if_unchanged`, so a write that lands in the
+    meantime isn't overwritten by the older value.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Generation of the latest set or delete per key, for the recent ones;
+        # fills that started before `_forgotten` are refused to stay safe
+        self._generation = 0
+        self._changed: OrderedDict = OrderedDict()
+        self._forgotten = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def generation(self) -> int:
+        """Current write generation, to pass to `set_if_unchanged` later."""
+        return self._generation
+
+    def set_if_unchanged(
+        self, key: Hashable, value: Any, generation: int, ttl: Optional[float] = None
+    ):
+        """Store a value read since `generation`, unless `key` was written since."""
+        if generation < self._forgotten or self._changed.get(key, 0) > generation:
+            return
+        self._store(key, value, ttl)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value; `ttl` overrides the cache-wide expiry for this entry."""
+        self._changed_now(key)
+        self._store(key, value, ttl)
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._changed_now(key)
+        self._entries.pop(key, None)
+
+    def _changed_now(self, key: Hashable):
+        self._generation += 1
+        self._changed[key] = self._generation
+        self._changed.move_to_end(key)
+        while len(self._changed) > max(self.maxsize, 1):
+            _, forgotten = self._changed.popitem(last=False)
+            self._forgotten = forgotten
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Single-book lookups, keyed by book id
+book_cache = LRUCache(
+    maxsize=settings.BOOK_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL_SECONDS
+)
+
+# Unfiltered facet counts, keyed by bucket limit
+facet_cache = LRUCache(maxsize=100, ttl=settings.FACET_CACHE_TTL_SECONDS)
+
+# Verified JWT claims, keyed by token digest; each entry expires with its token
+token_cache = LRUCache(maxsize=settings.TOKEN_CACHE_SIZE)
@@ -0,0 +1,29 @@
+import hashlib
+from typing import Any, Iterable, Optional
+
+
+def book_etag(book: Any) -> str:
+    """Strong ETag for a single book, derived from its row version."""
+    return f'"{book.id}.{book.version}"'
+
+
+def page_etag(books: Iterable[Any], *extra: Any) -> str:
+    """Strong ETag for a list page, derived from its rows' ids and versions."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((extra, [(book.id, book.version) for book in books])).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Check an If-None-Match (weak) or If-Match (strong) header against an ETag."""
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -7,11 +8,68 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///books (6).db")
+    DATABASE_REPLICA_URLS: str = ""  # comma-separated read replicas
+    READ_YOUR_WRITES_SECONDS: float = 5  # read from the primary after own writes
+    # Create missing tables at startup instead of running Alembic; development only
+    DATABASE_CREATE_ALL: bool = False
+
+    # Connection pool settings, for drivers that pool connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = -1  # replace connections older than this; -1 is off
+    DB_POOL_PRE_PING: bool = False  # test connections before handing them out
+
+    # Query profiling settings
+    SLOW_QUERY_THRESHOLD_MS: Optional[float] = None  # log slower statements
+    SLOW_QUERY_EXPLAIN: Literal["off", "plan", "analyze"] = "plan"
+    QUERY_BUDGET_STRICT: bool = False  # fail requests over their query budget
 
     # JWT settings
     SECRET_KEY: str = "your-secret-key-here"  # Change this in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_ENABLED: bool = True  # cache verified tokens until they expire
+    TOKEN_CACHE_SIZE: int = 10000
+
+    # Password hashing settings
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2  # 0 runs bcrypt on the default thread pool
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Book lookup cache settings
+    BOOK_CACHE_SIZE: int = 10000  # 0 disables the cache
+    BOOK_CACHE_TTL_SECONDS: float = 60
+
+    # Facet settings
+    FACET_CACHE_TTL_SECONDS: float = 5  # reuse of unfiltered facets; 0 disables
+
+    # Batch lookup settings
+    BATCH_GET_MAX_IDS: int = 100  # ids accepted by POST /books/batch-get
+
+    # Bulk change settings
+    BULK_CHANGE_MAX_IDS: int = 1000  # ids accepted by bulk update and delete
+    BULK_CHANGE_MAX_ROWS: int = 1000  # books a filter-only bulk change may touch
+
+    # Bulk import settings
+    BULK_IMPORT_BATCH_SIZE: int = 1000  # rows per INSERT and per transaction
+    BULK_IMPORT_MAX_ERRORS: int = 100  # row errors reported back in detail
+    BULK_IMPORT_MAX_LINE_BYTES: int = 1048576  # longer lines are row errors
+
+    # Export settings
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched per server-side cursor batch
+
+    # Real-time event settings
+    EVENT_QUEUE_SIZE: int = 100  # pending messages buffered per SSE subscriber
+    EVENT_OVERFLOW_POLICY: Literal["drop_oldest", "disconnect"] = "drop_oldest"
+    EVENT_HEARTBEAT_SECONDS: float = 15
+    EVENT_REPLAY_SIZE: int = 1000  # recent events kept for Last-Event-ID resumes
+    EVENT_BATCH_WINDOW_MS: float = 0  # coalesce book changes per window; 0 is off
+    # How events reach the other workers: "local" (single process),
+    # "unix" (processes on one host) or "postgres" (LISTEN/NOTIFY)
+    EVENT_BROKER: Literal["local", "unix", "postgres"] = "local"
+    EVENT_BROKER_URL: str = ""  # defaults to DATABASE_URL
+    EVENT_SOCKET_DIR: str = "/tmp/books-api-events"
 
     class Config:
         env_file = ".env"
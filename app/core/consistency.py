@@ -0,0 +1,94 @@
+"""Read-your-writes for clients whose reads may go to a lagging replica.
+
+A response to a request that wrote to the primary sets a signed cookie
+holding the time until which the client's reads should skip the replicas.
+Any worker can check it, so the guarantee holds whichever worker (or host)
+the client's next request reaches. Clients that don't keep cookies can send
+the `Set-Cookie` value back themselves; without it their reads may briefly
+miss their own writes.
+"""
+
+import hashlib
+import hmac
+import math
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.config import settings
+
+COOKIE_NAME = "read_primary_until"
+
+
+class WriteMarker:
+    """Whether the current request wrote to the primary."""
+
+    __slots__ = ("written",)
+
+    def __init__(self):
+        self.written = False
+
+
+write_marker: ContextVar[Optional[WriteMarker]] = ContextVar(
+    "write_marker", default=None
+)
+
+
+def _signature(value: str) -> str:
+    return hmac.new(
+        settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def sign_until(until: float) -> str:
+    value = f"{until:.3f}"
+    return f"{value}.{_signature(value)}"
+
+
+def primary_until(cookie: Optional[str]) -> float:
+    """The time carried by a valid cookie, or 0 when it's missing or forged."""
+    if not cookie:
+        return 0
+    value, _, signature = cookie.rpartition(".")
+    if not hmac.compare_digest(signature, _signature(value)):
+        return 0
+    try:
+        return float(value)
+    except ValueError:
+        return 0
+
+
+def reads_from_primary(cookie: Optional[str]) -> bool:
+    return primary_until(cookie) > time.time()
+
+
+class ReadYourWritesMiddleware:
+    """Adds the read-your-writes cookie to responses of requests that wrote."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        marker = WriteMarker()
+        token = write_marker.set(marker)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and marker.written:
+                seconds = settings.READ_YOUR_WRITES_SECONDS
+                cookie = (
+                    f"{COOKIE_NAME}={sign_until(time.time() + seconds)}; "
+                    f"Max-Age={math.ceil(seconds)}; Path=/; HttpOnly; SameSite=lax"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"set-cookie", cookie.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            write_marker.reset(token)
@@ -1,25 +1,263 @@
 import asyncio
-from typing import AsyncGenerator, List
+import itertools
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import (
+    AsyncGenerator,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from app.core.brokers import Broker, LocalBroker, create_broker
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+Event = Tuple[str, str]  # (event id, message)
+
+
+class Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
 
 
 class EventManager:
-    def __init__(self):
-        self.connections: List[asyncio.Queue] = []
+    """Fans messages out to SSE subscribers without ever waiting on them.
+
+    Each subscriber gets a bounded queue. When a slow client's queue is full,
+    the overflow policy either drops its oldest pending message or
+    disconnects it, so one stalled connection can't grow memory or hold up
+    the others. Idle streams get a comment line every `heartbeat_interval`
+    seconds to keep proxies from closing them.
 
-    async def subscribe(self) -> AsyncGenerator[str, None]:
-        queue = asyncio.Queue()
-        self.connections.append(queue)
+    Messages go through a `Broker` so that, with several workers, every
+    worker fans out every event to its own subscribers.
+
+    Every event gets an id when it is published, and the last `replay_size`
+    events are kept so a reconnecting client that sends its last seen id
+    only receives what it missed. The id travels with the event through the
+    broker, so any worker can resume a stream started on another one.
+
+    Changes sent with `publish_change` can be held for `batch_window`
+    seconds: repeated changes to the same key are coalesced and the window
+    goes out as a single frame, so bursts of writes don't flood clients.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 100,
+        overflow_policy: str = DROP_OLDEST,
+        heartbeat_interval: Optional[float] = 15,
+        broker: Optional[Broker] = None,
+        replay_size: int = 1000,
+        batch_window: float = 0,
+    ):
+        if overflow_policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.heartbeat_interval = heartbeat_interval
+        self.subscribers: Set[Subscriber] = set()
+        self.dropped = 0
+        self.disconnected = 0
+        self.broker = broker or LocalBroker()
+        self.broker.deliver = self._fan_out
+        self._last_timestamp = 0
+        # Recent events as (position, id, message), with positions by event id
+        self._received = 0
+        self._recent: Deque[Tuple[int, str, str]] = deque(maxlen=replay_size)
+        self._positions: Dict[str, int] = {}
+        self.batch_window = batch_window
+        self._pending: Dict[Hashable, Tuple[str, str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.broker.start()
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await self.broker.stop()
+
+    async def subscribe(
+        self, last_event_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
         try:
+            if last_event_id is not None:
+                missed = self.replay(last_event_id)
+                if missed is None:
+                    yield self._replay_unavailable(last_event_id)
+                else:
+                    for event in missed:
+                        yield self._format(event)
+
             while True:
-                message = await queue.get()
-                yield f"data: {message}\n\n"
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=self.heartbeat_interval
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Disconnected by the overflow policy
+                    return
+                yield self._format(event)
         finally:
-            self.connections.remove(queue)
+            self.subscribers.discard(subscriber)
+
+    def replay(self, last_event_id: str) -> Optional[List[Event]]:
+        """Return the events after `last_event_id`, or None if it has aged out."""
+        position = self._positions.get(last_event_id)
+        if position is None:
+            return None
+        start = position - self._recent[0][0] + 1
+        return [
+            (event_id, message)
+            for _, event_id, message in itertools.islice(self._recent, start, None)
+        ]
 
     async def broadcast(self, message: str):
-        for connection in self.connections:
-            await connection.put(message)
+        # Publishers have already committed their write, so a broker outage
+        # costs the event but never fails the request
+        try:
+            await self.broker.publish(f"{self._next_id()}\n{message}")
+        except Exception:
+            logger.exception("Could not publish event")
+
+    async def publish_change(self, event: str, key: Hashable, data: str):
+        """Publish a change to the object `key`; `data` is already JSON text."""
+        if self.batch_window <= 0:
+            await self.broadcast(self._change_message(event, data))
+            return
+
+        previous = self._pending.get(key)
+        if previous is not None and previous[0].endswith("_created"):
+            # Still new to clients that haven't seen the first frame
+            if not event.endswith("_deleted"):
+                event = previous[0]
+        self._pending[key] = (event, data)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Publish the pending changes as one frame."""
+        if not self._pending:
+            return
+        changes = [
+            self._change_message(event, data) for event, data in self._pending.values()
+        ]
+        self._pending.clear()
+        if len(changes) == 1:
+            await self.broadcast(changes[0])
+        else:
+            await self.broadcast(
+                self._change_message("batch", f"[{','.join(changes)}]")
+            )
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        self._flush_task = None
+        await self.flush()
+
+    @staticmethod
+    def _change_message(event: str, data: str) -> str:
+        return f'{{"event": {json.dumps(event)}, "data": {data}}}'
+
+    def _next_id(self) -> str:
+        # Increasing per publisher; the pid keeps ids unique across workers
+        self._last_timestamp = max(time.time_ns(), self._last_timestamp + 1)
+        return f"{self._last_timestamp}-{os.getpid()}"
+
+    def _fan_out(self, payload: str):
+        event_id, _, message = payload.partition("\n")
+        self._remember(event_id, message)
+        event = (event_id, message)
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._overflow(subscriber, event)
+
+    def _remember(self, event_id: str, message: str):
+        if self._recent.maxlen == 0:
+            return
+        if len(self._recent) == self._recent.maxlen:
+            del self._positions[self._recent[0][1]]
+        self._received += 1
+        self._recent.append((self._received, event_id, message))
+        self._positions[event_id] = self._received
+
+    def _overflow(self, subscriber: Subscriber, event: Event):
+        queue = subscriber.queue
+        if self.overflow_policy == DROP_OLDEST:
+            queue.get_nowait()
+            queue.put_nowait(event)
+            subscriber.dropped += 1
+            self.dropped += 1
+            return
+
+        # Too far behind to catch up: discard its backlog and end the stream
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+        self.subscribers.discard(subscriber)
+        self.disconnected += 1
+
+    @staticmethod
+    def _format(event: Event) -> str:
+        event_id, message = event
+        return f"id: {event_id}\ndata: {message}\n\n"
+
+    @staticmethod
+    def _replay_unavailable(last_event_id: str) -> str:
+        # The client missed more than we kept and has to reload its state
+        message = json.dumps(
+            {"event": "replay_unavailable", "data": {"last_event_id": last_event_id}}
+        )
+        return f"data: {message}\n\n"
+
+    def stats(self) -> dict:
+        depths = [subscriber.queue.qsize() for subscriber in self.subscribers]
+        return {
+            "subscribers": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+            "replay_buffered": len(self._recent),
+        }
 
 
 # Global event manager instance
-event_manager = EventManager()
+event_manager = EventManager(
+    queue_size=settings.EVENT_QUEUE_SIZE,
+    overflow_policy=settings.EVENT_OVERFLOW_POLICY,
+    heartbeat_interval=settings.EVENT_HEARTBEAT_SECONDS,
+    broker=create_broker(
+        settings.EVENT_BROKER,
+        settings.EVENT_BROKER_URL or settings.DATABASE_URL,
+        settings.EVENT_SOCKET_DIR,
+    ),
+    replay_size=settings.EVENT_REPLAY_SIZE,
+    batch_window=settings.EVENT_BATCH_WINDOW_MS / 1000,
+)
@@ -0,0 +1,269 @@
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """A metric family in the Prometheus text exposition format."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing value.
+
+    With a `callback` the value is read at scrape time instead; it returns
+    either a number or a dict mapping label value tuples to numbers.
+    """
+
+    type = "counter"
+
+    def __init__(self, *args, callback: Optional[Callable] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labelvalues):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+            self._values = values
+        for labelvalues, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {value}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+    def dec(self, amount: float = 1, *labelvalues):
+        self.inc(-amount, *labelvalues)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            # One count per bucket, then the sum and the total count
+            series = self._series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for labelvalues, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                labels = _labels(self.labelnames, labelvalues, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _labels(self.labelnames, labelvalues, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            labels = _labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {series[-2]}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time until the response starts, per route.",
+        ("method", "route", "status"),
+    )
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "Requests currently being handled.")
+)
+DB_QUERY_DURATION = registry.register(
+    Histogram("db_query_duration_seconds", "Time spent executing SQL statements.")
+)
+DB_POOL_CHECKED_OUT = registry.register(
+    Gauge("db_pool_checked_out", "Database connections currently checked out.")
+)
+DB_POOL_CHECKOUT_DURATION = registry.register(
+    Histogram(
+        "db_pool_checkout_duration_seconds",
+        "Time spent waiting for a database connection from the pool.",
+    )
+)
+
+
+class RequestStats:
+    """Per-request timings, exposed through the Server-Timing header."""
+
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def instrument_engine(engine: Engine):
+    """Record query and pool checkout timings for a (sync) engine.
+
+    For an AsyncEngine pass its `sync_engine`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.observe(duration)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += duration
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+    @event.listens_for(engine, "engine_disposed")
+    def engine_disposed(engine):
+        _time_pool_checkouts(engine.pool)
+
+    _time_pool_checkouts(engine.pool)
+
+
+def _time_pool_checkouts(pool):
+    # Pools have no "before checkout" event, so time the public connect() call
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_CHECKOUT_DURATION.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and adds a Server-Timing response header."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[Callable, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter() - started
+                timing = (
+                    f"app;dur={elapsed * 1000:.1f}, "
+                    f"db;dur={stats.query_seconds * 1000:.1f};"
+                    f'desc="{stats.queries} queries"'
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode()))
+                message = {**message, "headers": headers}
+                REQUEST_DURATION.observe(
+                    elapsed, scope["method"], self._route(scope), status_code
+                )
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            request_stats.reset(token)
+
+    def _route(self, scope) -> str:
+        """The matched route's path template, to keep label cardinality low."""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._routes:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                self._routes[endpoint] = "unmatched"
+        return self._routes[endpoint]
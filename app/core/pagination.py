@@ -0,0 +1,29 @@
+import base64
+import binascii
+import json
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(position: dict) -> str:
+    """Encode a keyset position into an opaque, URL-safe cursor."""
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor produced by ``encode_cursor``."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        position = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(position, dict):
+        raise InvalidCursor("Invalid cursor")
+    # Ids must fit the BIGINT the driver binds them as
+    last_id = position.get("id")
+    if type(last_id) is not int or not 0 <= last_id < 2**63:
+        raise InvalidCursor("Invalid cursor")
+    return position
@@ -1,27 +1,113 @@
+import asyncio
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 
+from app.core.cache import token_cache
 from app.core.config import settings
 from app.schemas.token import TokenData
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 
+# passlib and jose are imported on first use rather than at startup; most
+# requests only hit the token cache and never need either
+@lru_cache()
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+    )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a new hash if the stored one is outdated."""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded process pool.
+
+    Keeps hashing off the event loop and the request threadpool, and rejects
+    work with a 503 once ``max_workers + max_queue`` calls are in flight
+    instead of letting a burst of logins queue up without limit.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.in_flight >= max(self.max_workers, 1) + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._run(
+            verify_and_update_password, plain_password, hashed_password
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -60,6 +146,16 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Skip signature checks for tokens verified recently; entries expire with
+    # the token itself
+    cache_key = hashlib.sha256(token.encode()).digest()
+    if settings.TOKEN_CACHE_ENABLED:
+        token_data = token_cache.get(cache_key)
+        if token_data is not None:
+            return token_data
+
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -71,7 +167,11 @@ async def get_current_user(
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return TokenData(username=username)
+        token_data = TokenData(username=username)
+        expires_in = payload.get("exp", 0) - time.time()
+        if settings.TOKEN_CACHE_ENABLED and expires_in > 0:
+            token_cache.set(cache_key, token_data, ttl=expires_in)
+        return token_data
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,42 @@
+import json
+from typing import Any, List, Mapping, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.schemas.book import Book as BookSchema
+from app.schemas.book import PaginatedBooks
+
+book_adapter = TypeAdapter(BookSchema)
+paginated_books_adapter = TypeAdapter(PaginatedBooks)
+
+
+def encode_book(book: Any) -> bytes:
+    """Validate an ORM book once and return its JSON encoding."""
+    return book_adapter.dump_json(book_adapter.validate_python(book))
+
+
+def encode_paginated_books(**page: Any) -> bytes:
+    return paginated_books_adapter.dump_json(
+        paginated_books_adapter.validate_python(page)
+    )
+
+
+def encode_book_batch(books: List[bytes], missing: List[int]) -> bytes:
+    """Join already encoded books into a `BookBatch` body without re-encoding."""
+    return b'{"books":[%s],"missing":%s}' % (
+        b",".join(books),
+        json.dumps(missing, separators=(",", ":")).encode(),
+    )
+
+
+def json_response(
+    content: bytes, status_code: int = 200, headers: Optional[Mapping] = None
+) -> Response:
+    """Send pre-encoded JSON as is; FastAPI doesn't re-validate a Response."""
+    return Response(
+        content=content,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
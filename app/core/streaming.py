@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterable, List, Sequence, Union
+
+
+class InvalidLine(str):
+    """A line or record that can't be turned into a row, and why."""
+
+    def __new__(cls, text: str, reason: str = "Not valid UTF-8"):
+        line = super().__new__(cls, text)
+        line.reason = reason
+        return line
+
+
+def decode_line(line: bytes) -> str:
+    line = line.rstrip(b"\r")
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError:
+        return InvalidLine(line.decode("utf-8", errors="replace"))
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[str]:
+    """Split a stream of UTF-8 byte chunks into lines without buffering it all.
+
+    Lines are decoded one at a time, so a bad byte sequence only spoils its
+    own line, which comes out as an `InvalidLine`. So does a line longer than
+    `max_line_bytes`, whose bytes are skipped rather than held.
+    """
+    buffer = bytearray()
+    skipping = False  # the current line was already reported as too long
+    too_long = f"Line longer than {max_line_bytes} bytes"
+    async for chunk in chunks:
+        # A newline byte never occurs inside a multi-byte UTF-8 sequence
+        *lines, rest = chunk.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(buffer) + len(line) > max_line_bytes:
+                yield InvalidLine("", too_long)
+            elif buffer:
+                buffer += line
+                yield decode_line(bytes(buffer))
+            else:
+                yield decode_line(line)
+            buffer.clear()
+        if not skipping:
+            buffer += rest
+            if len(buffer) > max_line_bytes:
+                yield InvalidLine("", too_long)
+                buffer.clear()
+                skipping = True
+    if buffer:
+        yield decode_line(bytes(buffer))
+
+
+def _in_quoted_field(line: str, quoted: bool) -> bool:
+    """Whether a quoted field is still open after `line`, by csv's rules.
+
+    A quote opens a field only at its start; inside one, a doubled quote
+    stands for a quote and a single one closes the field.
+    """
+    state = "quoted" if quoted else "start"
+    for char in line:
+        if state == "quoted":
+            if char == '"':
+                state = "quote"
+        elif state == "quote" and char == '"':
+            state = "quoted"
+        elif char == ",":
+            state = "start"
+        elif char == '"' and state == "start":
+            state = "quoted"
+        else:
+            state = "field"
+    return state == "quoted"
+
+
+def _parse_record(lines: List[str], quoted: bool) -> Union[List[str], InvalidLine]:
+    text = "\n".join(lines)
+    invalid = next((line for line in lines if isinstance(line, InvalidLine)), None)
+    if invalid is not None:
+        return InvalidLine(text, invalid.reason)
+    if quoted:
+        return InvalidLine(text, "Quoted field never closed")
+    try:
+        return next(csv.reader([text]), [])
+    except csv.Error:
+        return InvalidLine(text, "Malformed CSV record")
+
+
+async def iter_csv_records(
+    lines: AsyncIterator[str], max_record_size: int
+) -> AsyncIterator[Union[List[str], InvalidLine]]:
+    """Parse CSV records from lines, joining quoted fields that span lines.
+
+    Records that can't be parsed come out as an `InvalidLine`: those with an
+    invalid line, those csv rejects, and a quoted field still open after
+    `max_record_size` characters, after which parsing resumes on the next
+    line.
+    """
+    pending: List[str] = []
+    size = 0
+    quoted = False
+    async for line in lines:
+        pending.append(line)
+        size += len(line) + 1
+        if quoted or '"' in line:
+            quoted = _in_quoted_field(line, quoted)
+        if quoted and size <= max_record_size:
+            continue
+        record = _parse_record(pending, quoted)
+        if record or isinstance(record, InvalidLine):
+            yield record
+        pending, size, quoted = [], 0, False
+    if pending:
+        record = _parse_record(pending, quoted)
+        if record or isinstance(record, InvalidLine):
+            yield record
+
+
+async def iter_csv_dicts(
+    lines: AsyncIterator[str], max_record_size: int
+) -> AsyncIterator[Union[dict, InvalidLine]]:
+    """Parse CSV records into dicts keyed by the header row; blanks become None.
+
+    Records that can't be parsed are passed on as `InvalidLine`s.
+    """
+    header = None
+    async for record in iter_csv_records(lines, max_record_size):
+        if header is None:
+            if isinstance(record, InvalidLine):
+                # Damaged column names fail validation on every row instead
+                try:
+                    record = next(csv.reader([record]), [])
+                except csv.Error:
+                    record = []
+            header = [name.strip() for name in record]
+            continue
+        if isinstance(record, InvalidLine):
+            yield record
+            continue
+        yield {name: value or None for name, value in zip(header, record)}
+
+
+def encode_ndjson(rows: Iterable[dict]) -> bytes:
+    """Encode rows as NDJSON; dates and other non-JSON values become strings."""
+    return "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
+
+
+def encode_csv(rows: Iterable[Sequence]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream on the fly into a single gzip member."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
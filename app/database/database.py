@@ -1,28 +1,173 @@
+import itertools
+from functools import lru_cache
+from typing import List
+
+from fastapi import Depends, Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from app.core.config import settings
+from app.core.consistency import COOKIE_NAME, reads_from_primary, write_marker
+from app.core.metrics import instrument_engine
+from app.database.profiling import log_slow_queries
+
+
+def normalize_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
 
 # Database configuration
-SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
-if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace(
-        "postgres://", "postgresql://", 1
-    )
+SQLALCHEMY_DATABASE_URL = normalize_url(settings.DATABASE_URL)
+REPLICA_URLS = [
+    normalize_url(url.strip())
+    for url in settings.DATABASE_REPLICA_URLS.split(",")
+    if url.strip()
+]
+
+
+def get_async_url(url: str) -> str:
+    """Swap the default sync driver of a database URL for its asyncio driver."""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def pool_options(url: str) -> dict:
+    """Pool settings for `url`, leaving out those its default pool doesn't take.
+
+    aiosqlite and in-memory SQLite don't use a QueuePool, so they only get
+    the options that every pool accepts.
+    """
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    parsed = make_url(url)
+    if issubclass(parsed.get_dialect().get_pool_class(parsed), QueuePool):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def create_async_sessionmaker(url: str) -> async_sessionmaker:
+    async_url = get_async_url(url)
+    async_engine = create_async_engine(async_url, **pool_options(async_url))
+    instrument_engine(async_engine.sync_engine)
+    if settings.SLOW_QUERY_THRESHOLD_MS is not None:
+        log_slow_queries(
+            async_engine.sync_engine,
+            settings.SLOW_QUERY_THRESHOLD_MS,
+            settings.SLOW_QUERY_EXPLAIN,
+        )
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# Create all tables if they don't exist
-Base.metadata.create_all(bind=engine)
+# Engines and session factories are built on first use, so importing this
+# module (in workers, tests or Alembic) doesn't touch the database
+
+
+@lru_cache()
+def get_engine() -> Engine:
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL)
+    )
+    instrument_engine(engine)
+    return engine
+
+
+@lru_cache()
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+# Async sessions are used by the API routers so queries don't block the loop
+@lru_cache()
+def get_async_session_factory() -> async_sessionmaker:
+    return create_async_sessionmaker(SQLALCHEMY_DATABASE_URL)
+
+
+# Read-only sessions are spread round-robin over the replicas, if any
+@lru_cache()
+def get_replica_sessionmakers() -> List[async_sessionmaker]:
+    return [create_async_sessionmaker(url) for url in REPLICA_URLS]
+
+
+_next_replica = itertools.count()
+
+
+def create_schema():
+    """Create missing tables with `create_all`, for development setups.
+
+    Deployments manage the schema with `alembic upgrade head` instead.
+    """
+    # Register the models, and the search and facet DDL hooks, first
+    import app.database.facets  # noqa: F401
+    import app.database.search  # noqa: F401
+    import app.models.user  # noqa: F401
+
+    Base.metadata.create_all(bind=get_engine())
+
+
+def mark_written():
+    """Send the client's reads to the primary until its writes have replicated.
+
+    The response to the current request carries the marker, see
+    `app.core.consistency`.
+    """
+    marker = write_marker.get()
+    if marker is not None and get_replica_sessionmakers():
+        marker.written = True
+
+
+def get_read_sessionmaker(
+    request: Request, primary: async_sessionmaker
+) -> async_sessionmaker:
+    """Pick a replica for a read, or `primary` if the client wrote recently."""
+    replicas = get_replica_sessionmakers()
+    if not replicas or reads_from_primary(request.cookies.get(COOKIE_NAME)):
+        return primary
+    return replicas[next(_next_replica) % len(replicas)]
 
 
 # Database dependency
 def get_db():
-    db = SessionLocal()
+    db = get_sessionmaker()()
     try:
         yield db
     finally:
         db.close()
+
+
+# Async database dependency
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
+
+
+# Session factory dependency for responses that outlive the request's session,
+# such as streamed bodies that keep reading after the endpoint returns
+def get_async_sessionmaker():
+    return get_async_session_factory()
+
+
+# Read-only session dependency; may lag behind the primary by the replication
+# delay, except for the caller's own recent writes
+async def get_async_read_db(
+    request: Request,
+    primary: async_sessionmaker = Depends(get_async_sessionmaker),
+):
+    async with get_read_sessionmaker(request, primary)() as db:
+        yield db
@@ -0,0 +1,310 @@
+"""Genre, author and decade counts for GET /books/facets.
+
+Counts are kept current by triggers on `books` in `book_facet_counts`, one
+row per (genre, author, decade) combination, so reads don't touch `books`.
+Unfiltered reads sum the whole table; each worker shares that aggregate for
+`FACET_CACHE_TTL_SECONDS` rather than keeping per-facet totals, whose few
+rows every write would have to update and so queue on.
+
+Missing genres and authors are stored as '' and a missing publication date
+as decade -1, so every bucket has a key.
+
+If the counts ever drift (triggers disabled, rows changed by hand), rebuild
+them with:
+
+    python -m app.database.facets rebuild
+"""
+
+import sys
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    cast,
+    event,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import facet_cache
+from app.database.database import Base
+from app.models.book import Book
+from app.schemas.book import BookFacets, BookFilter, FacetBucket
+
+# Not part of Base.metadata: it is created and filled alongside its triggers
+facet_metadata = MetaData()
+facet_counts = Table(
+    "book_facet_counts",
+    facet_metadata,
+    Column("genre", String, primary_key=True),
+    Column("author", String, primary_key=True),
+    Column("decade", Integer, primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+
+FACET_TABLE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS book_facet_counts (
+        genre VARCHAR NOT NULL,
+        author VARCHAR NOT NULL,
+        decade INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (genre, author, decade)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_book_facet_counts_author
+    ON book_facet_counts (author, decade)
+    """,
+]
+
+# Decade of a row's published_date, -1 when it is missing
+SQLITE_DECADE = (
+    "coalesce(CAST(substr({row}.published_date, 1, 4) AS INTEGER) / 10 * 10, -1)"
+)
+POSTGRES_DECADE = (
+    "coalesce(CAST(date_part('year', {row}.published_date) AS INTEGER) / 10 * 10, -1)"
+)
+
+
+def _bucket_of(row: str, decade: str) -> str:
+    return (
+        f"genre = coalesce({row}.genre, '') "
+        f"AND author = coalesce({row}.author, '') "
+        f"AND decade = {decade.format(row=row)}"
+    )
+
+
+def _increment(row: str, decade: str) -> str:
+    return f"""
+        INSERT INTO book_facet_counts (genre, author, decade, count)
+        VALUES (
+            coalesce({row}.genre, ''),
+            coalesce({row}.author, ''),
+            {decade.format(row=row)},
+            1
+        )
+        ON CONFLICT (genre, author, decade)
+        DO UPDATE SET count = book_facet_counts.count + 1;
+        """
+
+
+def _decrement(row: str, decade: str) -> str:
+    bucket = _bucket_of(row, decade)
+    return f"""
+        UPDATE book_facet_counts SET count = count - 1 WHERE {bucket};
+        DELETE FROM book_facet_counts WHERE {bucket} AND count <= 0;
+        """
+
+
+# Dropped first so databases created before a trigger change pick it up
+SQLITE_FACET_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS book_facet_counts_ai",
+    f"""
+    CREATE TRIGGER book_facet_counts_ai AFTER INSERT ON books BEGIN
+        {_increment("new", SQLITE_DECADE)}
+    END
+    """,
+    "DROP TRIGGER IF EXISTS book_facet_counts_ad",
+    f"""
+    CREATE TRIGGER book_facet_counts_ad AFTER DELETE ON books BEGIN
+        {_decrement("old", SQLITE_DECADE)}
+    END
+    """,
+    "DROP TRIGGER IF EXISTS book_facet_counts_au",
+    f"""
+    CREATE TRIGGER book_facet_counts_au
+    AFTER UPDATE OF genre, author, published_date ON books BEGIN
+        {_decrement("old", SQLITE_DECADE)}
+        {_increment("new", SQLITE_DECADE)}
+    END
+    """,
+]
+
+POSTGRES_FACET_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION book_facet_counts_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            {_decrement("OLD", POSTGRES_DECADE)}
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            {_increment("NEW", POSTGRES_DECADE)}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS book_facet_counts_sync ON books",
+    """
+    CREATE TRIGGER book_facet_counts_sync
+    AFTER INSERT OR DELETE OR UPDATE OF genre, author, published_date ON books
+    FOR EACH ROW EXECUTE FUNCTION book_facet_counts_sync()
+    """,
+]
+
+
+def rebuild_statements(dialect_name: str) -> List[str]:
+    decade = POSTGRES_DECADE if dialect_name == "postgresql" else SQLITE_DECADE
+    statements = [
+        "DELETE FROM book_facet_counts",
+        f"""
+        INSERT INTO book_facet_counts (genre, author, decade, count)
+        SELECT coalesce(genre, ''), coalesce(author, ''),
+               {decade.format(row="books")}, count(*)
+        FROM books
+        GROUP BY 1, 2, 3
+        """,
+    ]
+    if dialect_name == "postgresql":
+        # Hold off the triggers of concurrent writes until the rebuild commits
+        statements.insert(0, "LOCK TABLE book_facet_counts IN EXCLUSIVE MODE")
+    return statements
+
+
+def rebuild_facet_counts(connection):
+    """Recount every bucket from `books`, in the caller's transaction."""
+    for statement in rebuild_statements(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_facet_counts(target, connection, **kw):
+    """Create the facet counts alongside the tables for `create_all` setups.
+
+    Real deployments get the same objects from the Alembic migrations.
+    """
+    if not connection.dialect.has_table(connection, "books"):
+        return
+    if connection.dialect.name == "sqlite":
+        triggers = SQLITE_FACET_TRIGGERS
+    elif connection.dialect.name == "postgresql":
+        triggers = POSTGRES_FACET_TRIGGERS
+    else:
+        return
+    is_new = not all(
+        connection.dialect.has_table(connection, table.name)
+        for table in facet_metadata.sorted_tables
+    )
+    for statement in FACET_TABLE_DDL + triggers:
+        connection.execute(text(statement))
+    if is_new:
+        # Count rows that existed before the tables did
+        rebuild_facet_counts(connection)
+
+
+def aggregate_conditions(filters: BookFilter) -> Optional[list]:
+    """Conditions on `book_facet_counts` equivalent to `filters`.
+
+    Returns None when the counts can't answer the query: a title prefix, or
+    a date range that doesn't start and end on decade boundaries.
+    """
+    if filters.title_prefix is not None:
+        return None
+    conditions = []
+    if filters.author is not None:
+        conditions.append(facet_counts.c.author == filters.author)
+    if filters.genre is not None:
+        conditions.append(facet_counts.c.genre == filters.genre)
+    start, end = filters.published_from, filters.published_to
+    if start is not None:
+        if start != date(start.year - start.year % 10, 1, 1):
+            return None
+        conditions.append(facet_counts.c.decade >= start.year)
+    if end is not None:
+        if end != date(end.year - end.year % 10 + 9, 12, 31):
+            return None
+        conditions.append(facet_counts.c.decade.between(0, end.year))
+    return conditions
+
+
+def live_decade(dialect_name: str):
+    if dialect_name == "postgresql":
+        year = cast(func.date_part("year", Book.published_date), Integer)
+    else:
+        year = cast(func.substr(Book.published_date, 1, 4), Integer)
+    return func.coalesce(year // 10 * 10, -1)
+
+
+async def book_facets(
+    db: AsyncSession, filters: BookFilter, live_conditions: list, limit: int
+) -> BookFacets:
+    """Count books per genre, author and decade, top `limit` buckets each.
+
+    Reads use `book_facet_counts` when the filters allow it, and otherwise
+    group the matching rows of `books` with `live_conditions`. Unfiltered
+    results are cached per worker for `FACET_CACHE_TTL_SECONDS`.
+    """
+    if filters != BookFilter():
+        return await _count_facets(db, filters, live_conditions, limit)
+    cached = facet_cache.get(limit)
+    if cached is None:
+        cached = await _count_facets(db, filters, live_conditions, limit)
+        facet_cache.set(limit, cached)
+    return cached
+
+
+async def _count_facets(
+    db: AsyncSession, filters: BookFilter, live_conditions: list, limit: int
+) -> BookFacets:
+    conditions = aggregate_conditions(filters)
+    if conditions is not None:
+        count = func.sum(facet_counts.c.count)
+        columns = facet_counts.c
+        facets = [columns.genre, columns.author, columns.decade]
+        source = facet_counts
+    else:
+        conditions = live_conditions
+        count = func.count()
+        decade = live_decade(db.bind.dialect.name)
+        facets = [func.coalesce(Book.genre, ""), func.coalesce(Book.author, ""), decade]
+        source = Book.__table__
+
+    total = await db.scalar(
+        select(func.coalesce(count, 0)).select_from(source).where(*conditions)
+    )
+    buckets = []
+    for facet in facets:
+        rows = await db.execute(
+            select(facet, count)
+            .select_from(source)
+            .where(*conditions)
+            .group_by(facet)
+            .order_by(count.desc(), facet)
+            .limit(limit)
+        )
+        buckets.append(
+            [
+                FacetBucket(value=None if value in ("", -1) else value, count=n)
+                for value, n in rows
+            ]
+        )
+    genres, authors, decades = buckets
+    return BookFacets(total=total, genres=genres, authors=authors, decades=decades)
+
+
+def main(argv: List[str]) -> int:
+    if argv != ["rebuild"]:
+        print("usage: python -m app.database.facets rebuild", file=sys.stderr)
+        return 2
+    from app.database.database import get_engine
+
+    with get_engine().begin() as connection:
+        # Also restores the table and triggers if they are missing
+        Base.metadata.create_all(bind=connection)
+        create_facet_counts(Base.metadata, connection)
+        rebuild_facet_counts(connection)
+        buckets = connection.scalar(text("SELECT count(*) FROM book_facet_counts"))
+    print(f"Rebuilt {buckets} facet buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
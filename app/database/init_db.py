@@ -1,9 +1,9 @@
-from database import Base, engine
+from app.database.database import create_schema
 
 
 def init_db():
     print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    create_schema()
     print("Database tables created successfully!")
 
 
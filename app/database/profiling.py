@@ -0,0 +1,98 @@
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import request_stats
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a request runs more queries than declared."""
+
+
+def log_slow_queries(engine: Engine, threshold_ms: float, explain: str = "plan"):
+    """Log statements slower than `threshold_ms` with their parameters and plan.
+
+    `explain` is "off", "plan" (EXPLAIN / EXPLAIN QUERY PLAN) or "analyze"
+    (EXPLAIN ANALYZE on PostgreSQL, which runs the SELECT a second time).
+    For an AsyncEngine pass its `sync_engine`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        started = conn.info["slow_query_started"].pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < threshold_ms:
+            return
+        plan = None
+        if explain != "off" and not many:
+            plan = explain_statement(conn, statement, parameters, explain)
+        logger.warning(
+            "Slow query (%.1f ms): %s\nParameters: %r%s",
+            duration_ms,
+            statement,
+            parameters,
+            f"\nPlan:\n{plan}" if plan else "",
+        )
+
+
+def explain_statement(conn, statement: str, parameters, mode: str) -> Optional[str]:
+    keyword = statement.lstrip().split(None, 1)[0].upper()
+    if keyword not in EXPLAINABLE:
+        return None
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        # ANALYZE executes the statement, so never use it for writes
+        analyze = mode == "analyze" and keyword in ("SELECT", "WITH")
+        prefix = "EXPLAIN ANALYZE " if analyze else "EXPLAIN "
+    else:
+        return None
+
+    # A separate DBAPI cursor on the same connection, so the plan reflects
+    # the same transaction and the events above don't fire again
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as exc:
+        return f"EXPLAIN failed: {exc}"
+    finally:
+        cursor.close()
+    return "\n".join(" | ".join(str(value) for value in row) for row in rows)
+
+
+class QueryBudget:
+    """Route dependency that flags requests running more SQL than declared.
+
+    Logs a warning, or raises `QueryBudgetExceeded` when
+    `QUERY_BUDGET_STRICT` is set (as in the test suite).
+    """
+
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+
+    async def __call__(self):
+        yield
+        stats = request_stats.get()
+        if stats is None or stats.queries <= self.max_queries:
+            return
+        message = (
+            f"Request ran {stats.queries} queries, "
+            f"over its budget of {self.max_queries}"
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
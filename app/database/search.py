@@ -0,0 +1,111 @@
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import Base
+from app.models.book import Book
+
+# SQLite: external-content FTS5 table kept in sync with `books` by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, summary, content='books', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, summary)
+        VALUES (new.id, new.title, new.author, new.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, summary)
+        VALUES ('delete', old.id, old.title, old.author, old.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au
+    AFTER UPDATE OF title, author, summary ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, summary)
+        VALUES ('delete', old.id, old.title, old.author, old.summary);
+        INSERT INTO books_fts(rowid, title, author, summary)
+        VALUES (new.id, new.title, new.author, new.summary);
+    END
+    """,
+]
+
+# PostgreSQL: weighted tsvector generated column with a GIN index
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(author, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(summary, '')), 'C')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_books_search_vector
+    ON books USING gin (search_vector)
+    """,
+]
+
+BOOK_COLUMNS = ", ".join(f"books.{column.name}" for column in Book.__table__.columns)
+
+SQLITE_SEARCH_QUERY = f"""
+    SELECT {BOOK_COLUMNS}
+    FROM books_fts JOIN books ON books.id = books_fts.rowid
+    WHERE books_fts MATCH :query
+    ORDER BY bm25(books_fts, 10.0, 5.0, 1.0), books.id
+    LIMIT :limit OFFSET :skip
+"""
+
+POSTGRES_SEARCH_QUERY = f"""
+    SELECT {BOOK_COLUMNS}
+    FROM books, websearch_to_tsquery('english', :query) AS query
+    WHERE books.search_vector @@ query
+    ORDER BY ts_rank(books.search_vector, query) DESC, books.id
+    LIMIT :limit OFFSET :skip
+"""
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """Create the search index alongside the tables for `create_all` setups.
+
+    Real deployments get the same objects from the Alembic migration.
+    """
+    if not connection.dialect.has_table(connection, "books"):
+        return
+    if connection.dialect.name == "sqlite":
+        is_new = not connection.dialect.has_table(connection, "books_fts")
+        for statement in SQLITE_SEARCH_DDL:
+            connection.execute(text(statement))
+        if is_new:
+            # Index rows that existed before the search table did
+            connection.execute(
+                text("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+            )
+    elif connection.dialect.name == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            connection.execute(text(statement))
+
+
+def to_fts5_query(query: str) -> str:
+    """Quote every term so user input can't use FTS5 query syntax."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+async def search_books(db: AsyncSession, query: str, skip: int, limit: int):
+    """Return books matching `query`, best matches first."""
+    if not query.split():
+        # Nothing to look for; an empty FTS5 MATCH is a syntax error
+        return []
+    if db.bind.dialect.name == "postgresql":
+        statement = text(POSTGRES_SEARCH_QUERY)
+    else:
+        statement = text(SQLITE_SEARCH_QUERY)
+        query = to_fts5_query(query)
+    statement = statement.bindparams(query=query, skip=skip, limit=limit)
+    result = await db.scalars(select(Book).from_statement(statement))
+    return result.all()
@@ -1,39 +1,143 @@
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
+from fastapi.responses import PlainTextResponse
 
+from app import IMPORT_STARTED
 from app.api import auth, books, users
+from app.core.cache import book_cache, token_cache
+from app.core.config import settings
+from app.core.consistency import ReadYourWritesMiddleware
+from app.core.events import event_manager
+from app.core.metrics import Counter, Gauge, MetricsMiddleware, registry
+from app.core.security import password_hasher
+from app.database.database import create_schema
 
-app = FastAPI(
-    title="Book Management API",
-    description="A FastAPI application for managing books with authentication",
-    version="1.0.0",
-    swagger_ui_parameters={
-        "persistAuthorization": True,
-        "defaultModelsExpandDepth": -1,  # Hide schemas by default
-    },
-)
+logger = logging.getLogger(__name__)
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+STARTUP_SECONDS = registry.register(
+    Gauge(
+        "app_startup_seconds",
+        "Seconds from importing the app until the app object was built "
+        '(phase="import") and until it was ready to serve (phase="ready").',
+        ("phase",),
+    )
 )
 
-app.include_router(users.router, prefix="/users", tags=["users"])
-app.include_router(auth.router, prefix="/auth", tags=["auth"])
-app.include_router(books.router, prefix="/books", tags=["books"])
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DATABASE_CREATE_ALL:
+        await run_in_threadpool(create_schema)
+    await event_manager.start()
+
+    ready = time.perf_counter() - IMPORT_STARTED
+    STARTUP_SECONDS.set(app.state.built_at - IMPORT_STARTED, "import")
+    STARTUP_SECONDS.set(ready, "ready")
+    logger.info(
+        "Started in %.3fs (%.3fs importing)", ready, app.state.built_at - IMPORT_STARTED
+    )
+
+    yield
+    await event_manager.stop()
+    password_hasher.shutdown()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title="Book Management API",
+        description="A FastAPI application for managing books with authentication",
+        version="1.0.0",
+        lifespan=lifespan,
+        swagger_ui_parameters={
+            "persistAuthorization": True,
+            "defaultModelsExpandDepth": -1,  # Hide schemas by default
+        },
+    )
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    app.include_router(users.router, prefix="/users", tags=["users"])
+    app.include_router(auth.router, prefix="/auth", tags=["auth"])
+    app.include_router(books.router, prefix="/books", tags=["books"])
+
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to the Book Management API"}
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(
+            registry.render(), media_type="text/plain; version=0.0.4"
+        )
+
+    app.openapi = lambda: custom_openapi(app)
+    app.state.built_at = time.perf_counter()
+    return app
 
-@app.get("/")
-async def root():
-    return {"message": "Welcome to the Book Management API"}
+
+registry.register(
+    Gauge(
+        "sse_subscribers",
+        "Connected /books/stream clients.",
+        callback=lambda: event_manager.stats()["subscribers"],
+    )
+)
+registry.register(
+    Gauge(
+        "sse_queue_depth",
+        "Undelivered events buffered across SSE subscribers.",
+        callback=lambda: event_manager.stats()["queue_depth_total"],
+    )
+)
+registry.register(
+    Counter(
+        "sse_dropped_events",
+        "Events dropped for slow SSE subscribers.",
+        callback=lambda: event_manager.dropped,
+    )
+)
+registry.register(
+    Gauge(
+        "password_hash_in_flight",
+        "bcrypt calls running or queued.",
+        callback=lambda: password_hasher.in_flight,
+    )
+)
+registry.register(
+    Gauge(
+        "password_hash_queue_depth",
+        "bcrypt calls waiting for a free worker.",
+        callback=lambda: password_hasher.queue_depth,
+    )
+)
+for cache_name, cache in (("book", book_cache), ("token", token_cache)):
+    for result in ("hits", "misses"):
+        registry.register(
+            Counter(
+                f"{cache_name}_cache_{result}",
+                f"Lookups in the {cache_name} cache that were {result}.",
+                callback=lambda cache=cache, result=result: getattr(cache, result),
+            )
+        )
 
 
-def custom_openapi():
+def custom_openapi(app: FastAPI):
     if app.openapi_schema:
         return app.openapi_schema
 
@@ -73,4 +177,4 @@ def custom_openapi():
     return app.openapi_schema
 
 
-app.openapi = custom_openapi
+app = create_app()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Date, Integer, String
+from sqlalchemy import Column, Date, Index, Integer, String
 
 from app.database.database import Base
 
@@ -7,8 +7,33 @@ class Book(Base):
     __tablename__ = "books"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    author = Column(String, index=True)
+    title = Column(String)
+    author = Column(String)
     published_date = Column(Date)
     summary = Column(String)
     genre = Column(String)
+    # Bumped by the ORM on every UPDATE; backs ETags and optimistic locking
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # One index per (equality filter, sort key) pair used by GET /books/, each
+    # ending in id so keyset pagination seeks instead of sorting. The title
+    # and published_date ones also serve title prefix and date range filters
+    # when the results are sorted by that same column.
+    __table_args__ = (
+        Index("ix_books_title_id", "title", "id"),
+        Index("ix_books_published_date_id", "published_date", "id"),
+        Index("ix_books_author_id", "author", "id"),
+        Index("ix_books_author_title_id", "author", "title", "id"),
+        Index("ix_books_author_published_date_id", "author", "published_date", "id"),
+        Index("ix_books_genre_id", "genre", "id"),
+        Index("ix_books_genre_title_id", "genre", "title", "id"),
+        Index("ix_books_genre_published_date_id", "genre", "published_date", "id"),
+        # Title prefix ranges (and the title sort under a prefix) use code
+        # point order on PostgreSQL, which an index in the database collation
+        # can't serve
+        Index("ix_books_title_c_id", title.collate("C"), "id").ddl_if(
+            dialect="postgresql"
+        ),
+    )
@@ -1,7 +1,8 @@
 from datetime import date
-from typing import List, Optional
+from enum import Enum
+from typing import List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class BookBase(BaseModel):
@@ -28,6 +29,17 @@ class BookUpdate(BaseModel):
     genre: Optional[str] = None
 
 
+class BookPatch(BookUpdate):
+    """A `BookUpdate` that can't clear the fields every book must have."""
+
+    @model_validator(mode="after")
+    def required_fields_not_null(self):
+        for field in ("title", "author", "published_date"):
+            if field in self.model_fields_set and getattr(self, field) is None:
+                raise ValueError(f"{field} can't be null")
+        return self
+
+
 class Book(BookBase):
     id: int
 
@@ -35,8 +47,92 @@ class Book(BookBase):
         from_attributes = True
 
 
+class TotalMode(str, Enum):
+    exact = "exact"
+    estimate = "estimate"
+    none = "none"
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class BookSort(str, Enum):
+    id = "id"
+    id_desc = "-id"
+    title = "title"
+    title_desc = "-title"
+    published_date = "published_date"
+    published_date_desc = "-published_date"
+
+
+class BookFilter(BaseModel):
+    author: Optional[str] = None
+    genre: Optional[str] = None
+    published_from: Optional[date] = None
+    published_to: Optional[date] = None
+    title_prefix: Optional[str] = Field(None, min_length=1)
+
+
 class PaginatedBooks(BaseModel):
+    total: Optional[int]
+    skip: int
+    limit: int
+    books: List[Book]
+    next_cursor: Optional[str] = None
+
+
+class FacetBucket(BaseModel):
+    value: Union[str, int, None]
+    count: int
+
+
+class BookFacets(BaseModel):
     total: int
+    genres: List[FacetBucket]
+    authors: List[FacetBucket]
+    decades: List[FacetBucket]
+
+
+class BookSearchResults(BaseModel):
+    query: str
     skip: int
     limit: int
     books: List[Book]
+
+
+class BulkImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class BookBatchGet(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+
+
+class BookBatch(BaseModel):
+    books: List[Book]
+    missing: List[int]
+
+
+class BookSelection(BaseModel):
+    """Books picked by id, by the `GET /books/` filters, or both combined."""
+
+    ids: Optional[List[int]] = Field(None, min_length=1)
+    filter: Optional[BookFilter] = None
+
+
+class BookBulkUpdate(BookSelection):
+    patch: BookPatch
+
+
+class BulkChangeResult(BaseModel):
+    count: int
+    ids: List[int]
+
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
@@ -0,0 +1,382 @@
+"""End-to-end load benchmark.
+
+Seeds a synthetic catalog, starts the API with uvicorn (or targets a running
+server with --url) and drives a mixed workload of list, get, search, create
+and login requests alongside many concurrent SSE subscribers. Prints a JSON
+report with per-operation latency percentiles and throughput, suitable for
+comparing releases:
+
+    python -m benchmarks.load --books 1000000 --duration 60 --output run.json
+
+Runs are reproducible for a given --seed: the catalog, the request mix and
+the ids requested are all drawn from seeded generators.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+WORDS = (
+    "shadow river empire night garden silent winter stone glass secret fire "
+    "ocean crown storm journey iron house light memory song dark last city "
+    "forest wild golden broken hidden star paper queen war summer road"
+).split()
+GENRES = (
+    "Fiction Mystery Romance Fantasy Science-Fiction Thriller Biography "
+    "History Poetry Horror Classics Travel Cooking Philosophy Economics "
+    "Psychology Art Children Young-Adult Religion Politics Science Health "
+    "Memoir Humor Drama Crime Adventure Western Essays"
+).split()
+USER = {"username": "loadtest", "email": "loadtest@example.com", "password": "pw"}
+DEFAULT_MIX = "list=40,get=35,search=10,create=5,login=5,list_deep=5"
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    """Cumulative Zipf weights, so a few items get most of the picks."""
+    total, cumulative = 0.0, []
+    for rank in range(1, count + 1):
+        total += 1 / rank**exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def seed_catalog(database_url: str, books: int, seed: int, batch_size: int = 10000):
+    """Create the schema and insert `books` synthetic rows with skewed values."""
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import func, insert, select
+
+    from app.database.database import create_schema, get_engine
+    from app.models.book import Book
+
+    create_schema()
+    engine = get_engine()
+    with engine.begin() as conn:
+        existing = conn.scalar(select(func.count()).select_from(Book))
+    if existing >= books:
+        return existing
+
+    rng = random.Random(seed)
+    authors = [
+        f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}son"
+        for _ in range(max(books // 20, 1))
+    ]
+    author_weights = zipf_weights(len(authors))
+    genre_weights = zipf_weights(len(GENRES), exponent=0.8)
+    first_day = date(1850, 1, 1)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(existing, books, batch_size):
+            rows = []
+            for _ in range(min(batch_size, books - offset)):
+                title = " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+                rows.append(
+                    {
+                        "title": title,
+                        "author": rng.choices(authors, cum_weights=author_weights)[0],
+                        "genre": rng.choices(GENRES, cum_weights=genre_weights)[0],
+                        "published_date": first_day
+                        + timedelta(days=rng.randint(0, 175 * 365)),
+                        "summary": " ".join(rng.choices(WORDS, k=20)),
+                    }
+                )
+            conn.execute(insert(Book), rows)
+    print(
+        f"Seeded {books - existing} books in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+    return books
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, operation: str, seconds: float, ok: bool):
+        if ok:
+            self.latencies.setdefault(operation, []).append(seconds)
+        else:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def report(self, duration: float) -> dict:
+        operations = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies.get(operation, []))
+            operations[operation] = {
+                "count": len(samples),
+                "errors": self.errors.get(operation, 0),
+                "throughput_rps": round(len(samples) / duration, 2),
+                **percentiles(samples),
+            }
+        return operations
+
+
+def percentiles(samples: List[float]) -> dict:
+    if len(samples) < 2:
+        value = round(samples[0] * 1000, 3) if samples else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, books: int, seed: int, mix: str):
+        self.client = client
+        self.books = books
+        self.rng = random.Random(seed)
+        self.id_weights = zipf_weights(min(books, 100000))
+        names, weights = zip(
+            *(
+                (name, float(weight))
+                for name, weight in (part.split("=") for part in mix.split(","))
+            )
+        )
+        self.operations = [getattr(self, f"op_{name}") for name in names]
+        self.operation_weights = weights
+        self.recorder = Recorder()
+        self.created_at: Dict[str, float] = {}
+
+    def popular_id(self) -> int:
+        # Skewed towards low ids, like real traffic on a few hot titles
+        rank = self.rng.choices(range(len(self.id_weights)), self.id_weights)[0]
+        return rank % self.books + 1
+
+    async def op_list(self):
+        return await self.client.get("/books/", params={"limit": 20})
+
+    async def op_list_deep(self):
+        from app.core.pagination import encode_cursor
+
+        cursor = encode_cursor({"id": self.rng.randint(1, self.books)})
+        return await self.client.get("/books/", params={"cursor": cursor})
+
+    async def op_get(self):
+        return await self.client.get(f"/books/{self.popular_id()}")
+
+    async def op_search(self):
+        return await self.client.get(
+            "/books/search", params={"q": self.rng.choice(WORDS)}
+        )
+
+    async def op_create(self):
+        # The event can reach subscribers before the response reaches us, so
+        # delivery latency is measured from when the request was sent
+        marker = f"load-{self.rng.getrandbits(64):x}"
+        self.created_at[marker] = time.perf_counter()
+        return await self.client.post(
+            "/books/",
+            json={
+                "title": " ".join(self.rng.choices(WORDS, k=3)).title(),
+                "author": "Load Tester",
+                "published_date": "2024-01-01",
+                "summary": marker,
+                "genre": self.rng.choice(GENRES),
+            },
+        )
+
+    async def op_login(self):
+        return await self.client.post(
+            "/auth/login",
+            json={"username": USER["username"], "password": USER["password"]},
+        )
+
+    async def worker(self, deadline: float):
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(self.operations, self.operation_weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await operation()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            name = operation.__name__[3:]
+            self.recorder.record(name, time.perf_counter() - started, ok)
+
+    async def subscriber(self, deadline: float, deliveries: List[float], ready):
+        started = time.perf_counter()
+        try:
+            async with self.client.stream(
+                "GET", "/books/stream", timeout=None
+            ) as stream:
+                self.recorder.record(
+                    "stream_connect", time.perf_counter() - started, True
+                )
+                ready()
+                async for line in stream.aiter_lines():
+                    if time.perf_counter() >= deadline:
+                        break
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    changes = event["data"] if event["event"] == "batch" else [event]
+                    for change in changes:
+                        if change["event"] != "book_created":
+                            continue
+                        sent = self.created_at.get(change["data"]["summary"])
+                        if sent is not None:
+                            deliveries.append(time.perf_counter() - sent)
+        except httpx.HTTPError:
+            self.recorder.record("stream_connect", time.perf_counter() - started, False)
+            ready()
+
+
+async def run_workload(args, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency + args.subscribers + 10)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        await client.post("/users/", json=USER)
+        login = await client.post(
+            "/auth/login",
+            json={"username": USER["username"], "password": USER["password"]},
+        )
+        login.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+        workload = Workload(client, args.books, args.seed, args.mix)
+        deliveries: List[float] = []
+
+        # Connect every subscriber before starting the clock
+        connected = asyncio.Semaphore(0)
+        subscriber_deadline = time.perf_counter() + args.duration + 60
+        subscribers = [
+            asyncio.create_task(
+                workload.subscriber(subscriber_deadline, deliveries, connected.release)
+            )
+            for _ in range(args.subscribers)
+        ]
+        for _ in subscribers:
+            await connected.acquire()
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(workload.worker(deadline) for _ in range(args.concurrency))
+        )
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(1)  # let in-flight events reach the subscribers
+        for task in subscribers:
+            task.cancel()
+        await asyncio.gather(*subscribers, return_exceptions=True)
+
+    operations = workload.recorder.report(elapsed)
+    total = sum(
+        stats["count"] for name, stats in operations.items() if name != "stream_connect"
+    )
+    return {
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "operations": operations,
+        "sse": {
+            "subscribers": args.subscribers,
+            "deliveries": len(deliveries),
+            **percentiles(sorted(deliveries)),
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args) -> "tuple[subprocess.Popen, str]":
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": args.database_url}
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(f"{base_url}/", timeout=1)
+            return server, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,...")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        args.books = seed_catalog(args.database_url, args.books, args.seed)
+        server, base_url = start_server(args)
+    try:
+        results = asyncio.run(run_workload(args, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "books",
+                "seed",
+                "duration",
+                "concurrency",
+                "subscribers",
+                "workers",
+                "mix",
+            )
+        },
+        "database": args.database_url.split(":", 1)[0] if not args.url else None,
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
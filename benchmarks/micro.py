@@ -0,0 +1,353 @@
+"""Microbenchmarks for the request hot paths.
+
+Each benchmark times one building block in isolation: token checks,
+password hashing, response serialization, event fan-out and single-row
+lookups. A run calibrates the loop count, discards warmup rounds and
+reports per-call statistics over several repeats:
+
+    python -m benchmarks.micro                       # print results
+    python -m benchmarks.micro --save benchmarks/baseline.json
+    python -m benchmarks.micro --compare benchmarks/baseline.json
+
+Compare mode exits with status 1 when a benchmark's median is more than
+--threshold slower than the baseline, so a regression can be pinned to a
+layer without running the full load test. Baselines are only comparable on
+the machine they were recorded on.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+# Benchmarks use their own database so they never touch a real one
+_database = os.path.join(tempfile.mkdtemp(prefix="books-micro-"), "micro.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_database}"
+
+Runner = Callable[[int], float]  # runs the operation `loops` times, returns seconds
+BENCHMARKS: Dict[str, Callable[[], Runner]] = {}
+
+
+def benchmark(name: str):
+    def register(setup: Callable[[], Runner]):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def timed_loop(func: Callable[[], object]) -> Runner:
+    def run(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - started
+
+    return run
+
+
+def timed_async_loop(func: Callable[[], object]) -> Runner:
+    loop = asyncio.new_event_loop()
+
+    async def repeat(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            await func()
+        return time.perf_counter() - started
+
+    return lambda loops: loop.run_until_complete(repeat(loops))
+
+
+def make_token() -> str:
+    from app.core.security import create_access_token
+
+    return create_access_token({"sub": "bench"}, expires_delta=timedelta(hours=1))
+
+
+@benchmark("jwt_decode")
+def bench_jwt_decode() -> Runner:
+    from jose import jwt
+
+    from app.core.config import settings
+
+    token = make_token()
+    return timed_loop(
+        lambda: jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    )
+
+
+def current_user_runner(cache_enabled: bool) -> Runner:
+    from starlette.requests import Request
+
+    from app.core.cache import token_cache
+    from app.core.config import settings
+    from app.core.security import get_current_user
+
+    token = make_token()
+    request = Request(
+        {"type": "http", "method": "GET", "path": "/books/", "headers": []}
+    )
+    run = timed_async_loop(lambda: get_current_user(request, token))
+
+    def run_with_cache_setting(loops: int) -> float:
+        previous = settings.TOKEN_CACHE_ENABLED
+        settings.TOKEN_CACHE_ENABLED = cache_enabled
+        token_cache.clear()
+        try:
+            return run(loops)
+        finally:
+            settings.TOKEN_CACHE_ENABLED = previous
+
+    return run_with_cache_setting
+
+
+@benchmark("get_current_user")
+def bench_get_current_user() -> Runner:
+    return current_user_runner(cache_enabled=False)
+
+
+@benchmark("get_current_user_cached")
+def bench_get_current_user_cached() -> Runner:
+    return current_user_runner(cache_enabled=True)
+
+
+@benchmark("get_password_hash")
+def bench_get_password_hash() -> Runner:
+    from app.core.security import get_password_hash
+
+    return timed_loop(lambda: get_password_hash("correct horse battery staple"))
+
+
+@benchmark("verify_password")
+def bench_verify_password() -> Runner:
+    from app.core.security import get_password_hash, verify_password
+
+    hashed = get_password_hash("correct horse battery staple")
+    return timed_loop(lambda: verify_password("correct horse battery staple", hashed))
+
+
+def make_books(count: int) -> list:
+    from app.models.book import Book
+
+    return [
+        Book(
+            id=number,
+            title=f"Book {number}",
+            author=f"Author {number % 50}",
+            published_date=date(2000, 1, 1) + timedelta(days=number),
+            summary="A summary long enough to look like a real one. " * 3,
+            genre="Fiction",
+            version=1,
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+@benchmark("paginated_books_100")
+def bench_paginated_books() -> Runner:
+    from app.core.serialization import encode_paginated_books
+
+    books = make_books(100)
+    return timed_loop(
+        lambda: encode_paginated_books(
+            books=books, total=10000, skip=0, limit=100, next_cursor="eyJpZCI6MTAwfQ"
+        )
+    )
+
+
+def broadcast_runner(subscribers: int) -> Runner:
+    from app.core.events import EventManager, Subscriber
+
+    manager = EventManager(replay_size=1000)
+    # Unbounded queues so every broadcast measures the normal put path
+    queues = [Subscriber(queue_size=0) for _ in range(subscribers)]
+    manager.subscribers.update(queues)
+    message = json.dumps({"event": "book_created", "data": {"id": 1, "title": "x"}})
+    run = timed_async_loop(lambda: manager.broadcast(message))
+
+    def run_and_drain(loops: int) -> float:
+        elapsed = run(loops)
+        for subscriber in queues:
+            subscriber.queue = asyncio.Queue()
+        return elapsed
+
+    return run_and_drain
+
+
+@benchmark("broadcast_100")
+def bench_broadcast_100() -> Runner:
+    return broadcast_runner(100)
+
+
+@benchmark("broadcast_1000")
+def bench_broadcast_1000() -> Runner:
+    return broadcast_runner(1000)
+
+
+def seed_books(count: int):
+    from app.database.database import Base, get_engine, get_sessionmaker
+    from app.models.book import Book
+
+    Base.metadata.create_all(bind=get_engine())
+    with get_sessionmaker()() as db:
+        if not db.get(Book, count):
+            db.add_all(make_books(count))
+            db.commit()
+
+
+@benchmark("session_get")
+def bench_session_get() -> Runner:
+    from app.database.database import get_db
+    from app.models.book import Book
+
+    seed_books(100)
+
+    def lookup():
+        sessions = get_db()
+        db = next(sessions)
+        try:
+            db.get(Book, 42)
+        finally:
+            sessions.close()
+
+    return timed_loop(lookup)
+
+
+@benchmark("async_session_get")
+def bench_async_session_get() -> Runner:
+    from app.database.database import get_async_session_factory
+    from app.models.book import Book
+
+    seed_books(100)
+
+    async def lookup():
+        async with get_async_session_factory()() as db:
+            await db.get(Book, 42)
+
+    return timed_async_loop(lookup)
+
+
+def calibrate(run: Runner, min_time: float) -> int:
+    """Smallest power-of-ten loop count whose run takes at least `min_time`."""
+    loops = 1
+    while run(loops) < min_time and loops < 10**7:
+        loops *= 10
+    return loops
+
+
+def measure(run: Runner, repeats: int, warmup: int, min_time: float) -> dict:
+    loops = calibrate(run, min_time)
+    for _ in range(warmup):
+        run(loops)
+    # Like timeit, keep collector pauses out of the samples
+    gc.collect()
+    gc.disable()
+    try:
+        samples = [run(loops) / loops for _ in range(repeats)]
+    finally:
+        gc.enable()
+    return {
+        "loops": loops,
+        "repeats": repeats,
+        "median_us": statistics.median(samples) * 1e6,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "stdev_us": statistics.stdev(samples) * 1e6 if repeats > 1 else 0.0,
+        "min_us": min(samples) * 1e6,
+        "max_us": max(samples) * 1e6,
+    }
+
+
+def run_benchmarks(
+    names: List[str], repeats: int, warmup: int, min_time: float
+) -> Dict[str, dict]:
+    results = {}
+    for name in names:
+        results[name] = {
+            key: round(value, 3) if isinstance(value, float) else value
+            for key, value in measure(
+                BENCHMARKS[name](), repeats, warmup, min_time
+            ).items()
+        }
+        print(
+            f"{name:<26} {results[name]['median_us']:>14.3f} us"
+            f"  ± {results[name]['stdev_us']:.3f}",
+            file=sys.stderr,
+        )
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float):
+    """Print the change per benchmark and return the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<26} {'(no baseline)':>14}", file=sys.stderr)
+            continue
+        change = result["median_us"] / before["median_us"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<26} {before['median_us']:>14.3f} -> "
+            f"{result['median_us']:.3f} us  {change:+.1%}"
+            f"{'  REGRESSION' if regressed else ''}",
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-k", "--filter", help="only run benchmarks whose name contains this"
+    )
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed rounds")
+    parser.add_argument(
+        "--min-time", type=float, default=0.05, help="seconds per timed round"
+    )
+    parser.add_argument("--save", help="write the results as a baseline file")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fractional slowdown that counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    results = run_benchmarks(names, args.repeats, args.warmup, args.min_time)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["benchmarks"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    elif not args.save:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
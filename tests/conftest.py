@@ -1,17 +1,41 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.core.security import create_access_token, get_password_hash
-from app.database.database import Base, get_db
+from app.core.cache import book_cache, facet_cache
+from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.security import (
+    create_access_token,
+    get_password_hash,
+    password_hasher,
+)
+from app.database.database import (
+    Base,
+    get_async_db,
+    get_async_sessionmaker,
+    get_db,
+)
 from app.main import app
 from app.models.user import User
 from app.schemas.token import TokenData
 
+# Hash on the default thread pool; the process pool has its own test
+password_hasher.max_workers = 0
+
+# Fail any request that runs more queries than its route declares
+settings.QUERY_BUDGET_STRICT = True
+
 # Create a test database engine
 engine = create_engine("sqlite:///./test.db")
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+instrument_engine(async_engine.sync_engine)
 
 
 def test_db():
@@ -22,6 +46,11 @@ def test_db():
         db.close()
 
 
+async def test_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 @pytest.fixture(scope="function")
 def clear_db():
     # Create all tables
@@ -33,6 +62,8 @@ def clear_db():
         for table in reversed(Base.metadata.sorted_tables):
             conn.execute(text(f"DELETE FROM {table.name}"))
             conn.commit()
+    book_cache.clear()
+    facet_cache.clear()
 
 
 @pytest.fixture(scope="function")
@@ -62,6 +93,19 @@ def test_user(db_session):
 def client(clear_db):
     # Override the database dependency
     app.dependency_overrides[get_db] = test_db
+    app.dependency_overrides[get_async_db] = test_async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: TestingAsyncSessionLocal
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def test_user_token(client, test_user):
+    """Get authentication token for test user"""
+    response = client.post(
+        "/auth/login",
+        json={"username": "testuser", "password": "testpassword"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
@@ -1,5 +1,12 @@
+import asyncio
+
 import pytest
-from fastapi import status
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.security import PasswordHasher
+from app.models.user import User
 
 
 def test_create_user(client):
@@ -89,3 +96,58 @@ def test_login_nonexistent_user(client):
     )
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
     assert "Incorrect username or password" in response.json()["detail"]
+
+
+def test_login_rehashes_outdated_password(client, db_session):
+    """Test that a hash with an old work factor is upgraded on login"""
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    user = User(
+        username="legacyuser",
+        email="legacy@example.com",
+        hashed_password=old_context.hash("testpassword"),
+    )
+    db_session.add(user)
+    db_session.commit()
+
+    response = client.post(
+        "/auth/login", json={"username": "legacyuser", "password": "testpassword"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    db_session.refresh(user)
+    assert user.hashed_password.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    response = client.post(
+        "/auth/login", json={"username": "legacyuser", "password": "testpassword"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_password_hasher_process_pool():
+    """Test that hashing round-trips through the worker processes"""
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify_and_update("secret", hashed)
+
+    try:
+        valid, new_hash = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert valid is True
+    assert new_hash is None
+
+
+def test_password_hasher_rejects_when_queue_full():
+    """Test that excess hashing work is shed with a 503"""
+    hasher = PasswordHasher(max_workers=0, max_queue=0)
+
+    async def run():
+        return await asyncio.gather(
+            hasher.hash("one"), hasher.hash("two"), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    errors = [r for r in results if isinstance(r, HTTPException)]
+    assert len(errors) == 1
+    assert errors[0].status_code == status.HTTP_503_SERVICE_UNAVAILABLE
@@ -1,9 +1,19 @@
-from datetime import date
+import json
+from datetime import date, timedelta
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
 
+from app.api.books import after_position, filter_conditions, sort_key
+from app.core.cache import book_cache, facet_cache, token_cache
+from app.core.events import event_manager
+from app.core.pagination import encode_cursor
+from app.core.security import create_access_token
+from app.database.facets import rebuild_facet_counts
 from app.models.book import Book
+from app.schemas.book import BookFilter, BookSort
 
 # Test data
 TEST_USER = {
@@ -21,17 +31,6 @@ TEST_BOOK = {
 }
 
 
-@pytest.fixture
-def test_user_token(client: TestClient, test_user):
-    """Get authentication token for test user"""
-    response = client.post(
-        "/auth/login",
-        json={"username": TEST_USER["username"], "password": TEST_USER["password"]},
-    )
-    assert response.status_code == 200
-    return response.json()["access_token"]
-
-
 @pytest.fixture
 def created_book(db_session):
     """Create a test book directly in the database and return it"""
@@ -126,3 +125,658 @@ def test_create_book_invalid_date(client: TestClient, test_user_token):
     }
     response = client.post("/books/", json=invalid_date_book, headers=headers)
     assert response.status_code == 422  # Validation error
+
+
+@pytest.fixture
+def many_books(db_session):
+    """Create several books directly in the database and return them"""
+    books = []
+    for i in range(5):
+        book_data = TEST_BOOK.copy()
+        book_data["title"] = f"Test Book {i}"
+        book_data["published_date"] = date(2023, 1, i + 1)
+        books.append(Book(**book_data))
+    db_session.add_all(books)
+    db_session.commit()
+    for book in books:
+        db_session.refresh(book)
+    return books
+
+
+def test_list_books_cursor_pagination(client: TestClient, test_user_token, many_books):
+    """Test that following next_cursor walks every book exactly once"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/books/", params=params, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(book["id"] for book in data["books"])
+        if data["next_cursor"] is None:
+            break
+        params = {"limit": 2, "cursor": data["next_cursor"]}
+    assert seen == [book.id for book in many_books]
+
+
+def test_list_books_offset_pagination(client: TestClient, test_user_token, many_books):
+    """Test that skip/limit keeps working alongside cursors"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get("/books/?skip=3&limit=10", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 5
+    assert [book["id"] for book in data["books"]] == [b.id for b in many_books[3:]]
+    assert data["next_cursor"] is None
+
+
+def test_list_books_invalid_cursor(client: TestClient, test_user_token):
+    """Test that a malformed cursor is rejected"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get("/books/?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+
+    for last_id in [10**30, -1, True]:
+        cursor = encode_cursor({"id": last_id})
+        response = client.get("/books/", params={"cursor": cursor}, headers=headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_list_books_filters(client: TestClient, test_user_token, db_session):
+    """Test filtering by author, genre, publication date range and title prefix"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    db_session.add_all(
+        Book(**{**TEST_BOOK, "published_date": date(2024, 1, 1), **fields})
+        for fields in [
+            {"title": "Dune", "author": "Herbert", "published_date": date(1965, 8, 1)},
+            {"title": "Dune Messiah", "author": "Herbert", "genre": "Classic"},
+            {"title": "Emma", "author": "Austen", "published_date": date(1815, 12, 23)},
+            {"title": "Du_al", "author": "Nobody"},
+        ]
+    )
+    db_session.commit()
+
+    def titles(**params):
+        response = client.get("/books/", params=params, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == len(data["books"])
+        return [book["title"] for book in data["books"]]
+
+    assert titles(author="Herbert") == ["Dune", "Dune Messiah"]
+    assert titles(genre="Classic") == ["Dune Messiah"]
+    assert titles(title_prefix="Dune") == ["Dune", "Dune Messiah"]
+    assert titles(title_prefix="Du_") == ["Du_al"]
+    assert titles(published_from="1800-01-01", published_to="1970-01-01") == [
+        "Dune",
+        "Emma",
+    ]
+    assert titles(author="Herbert", published_to="2000-01-01") == ["Dune"]
+
+
+def test_title_prefix_range_in_code_point_order():
+    """Test that PostgreSQL compares title prefix ranges in code point order"""
+    conditions = filter_conditions(BookFilter(title_prefix="The "), "postgresql")
+    sql = str(select(Book.id).where(*conditions).compile(dialect=postgresql.dialect()))
+    assert sql.count('(books.title COLLATE "C")') == 2
+
+    # Sorting by title under a prefix uses the same order, keyset included
+    column, _ = sort_key(BookSort.title, code_point_titles=True)
+    cursor = encode_cursor({"id": 1, "sort": "title", "key": "The A"})
+    after = after_position(cursor, BookSort.title, code_point_titles=True)
+    query = select(Book.id).where(*conditions, after).order_by(column, Book.id)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert sql.count('books.title COLLATE "C"') == 4
+
+
+@pytest.mark.parametrize(
+    "sort,key",
+    [
+        ("title", lambda book: (book.title, book.id)),
+        ("-title", lambda book: (book.title, book.id)),
+        ("published_date", lambda book: (book.published_date, book.id)),
+        ("-published_date", lambda book: (book.published_date, book.id)),
+        ("-id", lambda book: book.id),
+    ],
+)
+def test_list_books_sorted_cursor_pagination(
+    client: TestClient, test_user_token, db_session, sort, key
+):
+    """Test that cursors walk every book exactly once in any sort order"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    books = [
+        Book(
+            **{
+                **TEST_BOOK,
+                "title": f"Book {i % 3}",
+                "published_date": date(2023, 1, 1 + i % 2),
+            }
+        )
+        for i in range(7)
+    ]
+    db_session.add_all(books)
+    db_session.commit()
+    expected = sorted(books, key=key, reverse=sort.startswith("-"))
+
+    seen = []
+    params = {"limit": 2, "sort": sort}
+    while True:
+        data = client.get("/books/", params=params, headers=headers).json()
+        seen.extend(book["id"] for book in data["books"])
+        if data["next_cursor"] is None:
+            break
+        params = {"limit": 2, "sort": sort, "cursor": data["next_cursor"]}
+    assert seen == [book.id for book in expected]
+
+
+def test_list_books_cursor_sort_mismatch(
+    client: TestClient, test_user_token, many_books
+):
+    """Test that a cursor can't be reused with a different sort order"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get("/books/?limit=2&sort=title", headers=headers)
+    cursor = response.json()["next_cursor"]
+    response = client.get(f"/books/?sort=-title&cursor={cursor}", headers=headers)
+    assert response.status_code == 400
+
+    response = client.get("/books/?sort=summary", headers=headers)
+    assert response.status_code == 422
+
+
+def test_book_facets(client: TestClient, test_user_token):
+    """Test that facet counts follow creates, updates and deletes"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    books = [
+        {"author": "Herbert", "genre": "SF", "published_date": "1965-08-01"},
+        {"author": "Herbert", "genre": "SF", "published_date": "1969-10-01"},
+        {"author": "Austen", "genre": None, "published_date": "1815-12-23"},
+    ]
+    ids = [
+        client.post("/books/", json={**TEST_BOOK, **book}, headers=headers).json()["id"]
+        for book in books
+    ]
+
+    def facets(**params):
+        response = client.get("/books/facets", params=params, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        return {
+            key: (
+                data[key]
+                if key == "total"
+                else {bucket["value"]: bucket["count"] for bucket in data[key]}
+            )
+            for key in data
+        }
+
+    assert facets() == {
+        "total": 3,
+        "genres": {"SF": 2, None: 1},
+        "authors": {"Herbert": 2, "Austen": 1},
+        "decades": {1960: 2, 1810: 1},
+    }
+
+    client.patch(f"/books/{ids[0]}", json={"genre": "Classic"}, headers=headers)
+    client.delete(f"/books/{ids[2]}", headers=headers)
+    # Unfiltered counts are reused until the cached aggregate expires
+    assert facets()["total"] == 3
+    facet_cache.clear()
+    assert facets() == {
+        "total": 2,
+        "genres": {"SF": 1, "Classic": 1},
+        "authors": {"Herbert": 2},
+        "decades": {1960: 2},
+    }
+
+    # Served from the combination table, and from the rows themselves
+    assert facets(genre="SF")["authors"] == {"Herbert": 1}
+    assert facets(published_from="1960-01-01", published_to="1969-12-31")["total"] == 2
+    assert facets(published_from="1966-01-01")["total"] == 1
+    assert facets(title_prefix="Nope")["total"] == 0
+
+
+def test_rebuild_facet_counts(client: TestClient, test_user_token, db_session):
+    """Test that a rebuild restores counts that drifted from the rows"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.post("/books/", json=TEST_BOOK, headers=headers)
+    db_session.execute(text("UPDATE book_facet_counts SET count = 99"))
+    db_session.commit()
+
+    def total(**params):
+        facet_cache.clear()
+        response = client.get("/books/facets", params=params, headers=headers)
+        return response.json()["total"]
+
+    assert total() == 99
+    assert total(author=TEST_BOOK["author"]) == 99
+
+    with db_session.bind.begin() as connection:
+        rebuild_facet_counts(connection)
+    assert total() == 1
+    assert total(author=TEST_BOOK["author"]) == 1
+
+
+def test_batch_get_books(client: TestClient, test_user_token, many_books):
+    """Test fetching several books at once in request order"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    ids = [book.id for book in many_books]
+    client.get(f"/books/{ids[1]}", headers=headers)  # one of them is cached
+
+    response = client.post(
+        "/books/batch-get",
+        json={"ids": [ids[3], 9999, ids[1], ids[0], ids[3]]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["id"] for book in data["books"]] == [ids[3], ids[1], ids[0]]
+    assert data["books"][0]["title"] == many_books[3].title
+    assert data["missing"] == [9999]
+
+
+def test_batch_get_books_limit(client: TestClient, test_user_token, monkeypatch):
+    """Test that batch lookups are capped and can't be empty"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    monkeypatch.setattr("app.core.config.settings.BATCH_GET_MAX_IDS", 2)
+    response = client.post("/books/batch-get", json={"ids": [1, 2, 3]}, headers=headers)
+    assert response.status_code == 422
+    response = client.post("/books/batch-get", json={"ids": []}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_search_books(client: TestClient, test_user_token):
+    """Test that search ranks matches and follows creates, updates and deletes"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    dune = client.post(
+        "/books/",
+        json={**TEST_BOOK, "title": "Dune", "summary": "Spice on a desert planet"},
+        headers=headers,
+    ).json()
+    client.post(
+        "/books/",
+        json={**TEST_BOOK, "title": "Other", "summary": "Mentions dune once"},
+        headers=headers,
+    )
+
+    response = client.get("/books/search", params={"q": "dune"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["title"] for book in data["books"]] == ["Dune", "Other"]
+
+    client.patch(f"/books/{dune['id']}", json={"title": "Arrakis"}, headers=headers)
+    response = client.get("/books/search", params={"q": "arrakis"}, headers=headers)
+    assert [book["id"] for book in response.json()["books"]] == [dune["id"]]
+
+    client.delete(f"/books/{dune['id']}", headers=headers)
+    response = client.get("/books/search", params={"q": "arrakis"}, headers=headers)
+    assert response.json()["books"] == []
+
+
+def test_search_books_ignores_query_syntax(client: TestClient, test_user_token):
+    """Test that FTS operators in user input are treated as plain words"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get(
+        "/books/search", params={"q": 'title:"AND (NOT*'}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["books"] == []
+
+
+def test_search_books_blank_query(client: TestClient, test_user_token):
+    """Test that a query of only whitespace matches nothing"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.post("/books/", json=TEST_BOOK, headers=headers)
+    response = client.get("/books/search", params={"q": "  "}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["books"] == []
+
+
+def test_get_book_cache_follows_writes(
+    client: TestClient, test_user_token, created_book
+):
+    """Test that cached lookups are refreshed on update and dropped on delete"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    url = f"/books/{created_book.id}"
+    assert client.get(url, headers=headers).json()["title"] == TEST_BOOK["title"]
+    hits = book_cache.hits
+    assert client.get(url, headers=headers).json()["title"] == TEST_BOOK["title"]
+    assert book_cache.hits == hits + 1
+
+    client.patch(url, json={"title": "Renamed"}, headers=headers)
+    assert client.get(url, headers=headers).json()["title"] == "Renamed"
+
+    client.delete(url, headers=headers)
+    assert client.get(url, headers=headers).status_code == 404
+
+
+def test_list_books_total_modes(client: TestClient, test_user_token, many_books):
+    """Test that the total can be exact, estimated or skipped"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    for mode, expected in [("exact", 5), ("estimate", 5), ("none", None)]:
+        response = client.get(f"/books/?total={mode}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["total"] == expected
+
+    # SQLite estimates from the largest id instead of counting rows
+    client.delete(f"/books/{many_books[0].id}", headers=headers)
+    response = client.get("/books/?total=estimate", headers=headers)
+    assert response.json()["total"] == 5
+    response = client.get("/books/?total=approximate", headers=headers)
+    assert response.status_code == 422
+
+
+def test_bulk_import_ndjson(client: TestClient, test_user_token):
+    """Test that NDJSON rows are imported and bad rows are reported"""
+    headers = {
+        "Authorization": f"Bearer {test_user_token}",
+        "Content-Type": "application/x-ndjson",
+    }
+    lines = [json.dumps({**TEST_BOOK, "title": f"Bulk {i}"}) for i in range(3)]
+    lines.insert(1, json.dumps({**TEST_BOOK, "title": ""}))
+    lines.insert(3, "{not json")
+    response = client.post("/books/bulk", content="\n".join(lines), headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 3
+    assert data["failed"] == 2
+    assert [error["row"] for error in data["errors"]] == [2, 4]
+
+    response = client.get(
+        "/books/", headers={"Authorization": headers["Authorization"]}
+    )
+    assert response.json()["total"] == 3
+
+
+def test_bulk_import_csv(client: TestClient, test_user_token):
+    """Test that CSV rows, including quoted multi-line fields, are imported"""
+    headers = {
+        "Authorization": f"Bearer {test_user_token}",
+        "Content-Type": "text/csv",
+    }
+    body = (
+        "title,author,published_date,summary,genre\n"
+        'CSV Book,Someone,2020-05-01,"Line one\nline two",\n'
+        "Bad Date,Someone,yesterday,,\n"
+    )
+    response = client.post("/books/bulk", content=body, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 1
+    assert data["failed"] == 1
+    assert data["errors"][0]["row"] == 2
+
+    response = client.get(
+        "/books/", headers={"Authorization": headers["Authorization"]}
+    )
+    book = response.json()["books"][0]
+    assert book["summary"] == "Line one\nline two"
+    assert book["genre"] is None
+
+
+def test_bulk_update_books(client: TestClient, test_user_token, many_books):
+    """Test that a patch is applied to the selected books in one statement"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    ids = [book.id for book in many_books]
+    etag = client.get(f"/books/{ids[0]}", headers=headers).headers["ETag"]
+
+    response = client.post(
+        "/books/bulk-update",
+        json={
+            "ids": ids[:3],
+            "filter": {"published_from": "2023-01-02"},
+            "patch": {"genre": "Retagged"},
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2, "ids": ids[1:3]}
+
+    response = client.get("/books/", params={"genre": "Retagged"}, headers=headers)
+    assert [book["id"] for book in response.json()["books"]] == ids[1:3]
+    # Untouched books keep their version, changed ones get a new one
+    response = client.get(
+        f"/books/{ids[0]}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    response = client.get(f"/books/{ids[1]}", headers=headers)
+    assert response.json()["genre"] == "Retagged"
+
+
+def test_bulk_delete_books(client: TestClient, test_user_token, many_books):
+    """Test that the books matching a filter are deleted in one statement"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    ids = [book.id for book in many_books]
+    client.get(f"/books/{ids[4]}", headers=headers)  # cached before the delete
+
+    response = client.post(
+        "/books/bulk-delete",
+        json={"filter": {"published_from": "2023-01-04"}},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2, "ids": ids[3:]}
+    assert client.get(f"/books/{ids[4]}", headers=headers).status_code == 404
+    assert client.get("/books/", headers=headers).json()["total"] == 3
+
+    response = client.post("/books/bulk-delete", json={"ids": [9999]}, headers=headers)
+    assert response.json() == {"count": 0, "ids": []}
+
+
+def test_bulk_delete_flushes_pending_changes(
+    client: TestClient, test_user_token, created_book, monkeypatch
+):
+    """Test that batched single-book changes go out before a bulk event"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    sent = []
+
+    async def record(message):
+        sent.append(json.loads(message)["event"])
+
+    monkeypatch.setattr(event_manager, "batch_window", 60)
+    monkeypatch.setattr(event_manager, "broadcast", record)
+    client.patch(f"/books/{created_book.id}", json={"genre": "Other"}, headers=headers)
+    client.post("/books/bulk-delete", json={"ids": [created_book.id]}, headers=headers)
+    assert sent == ["book_updated", "books_deleted"]
+
+
+def test_bulk_changes_need_a_selection(
+    client: TestClient, test_user_token, monkeypatch
+):
+    """Test that bulk changes refuse to touch every book or run on too many ids"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    for body in [{}, {"filter": {}}, {"ids": []}]:
+        response = client.post("/books/bulk-delete", json=body, headers=headers)
+        assert response.status_code == 422
+    response = client.post(
+        "/books/bulk-update", json={"ids": [1], "patch": {}}, headers=headers
+    )
+    assert response.status_code == 422
+    response = client.post(
+        "/books/bulk-update",
+        json={"ids": [1], "patch": {"title": None}},
+        headers=headers,
+    )
+    assert response.status_code == 422
+    monkeypatch.setattr("app.core.config.settings.BULK_CHANGE_MAX_IDS", 2)
+    response = client.post(
+        "/books/bulk-delete", json={"ids": [1, 2, 3]}, headers=headers
+    )
+    assert response.status_code == 422
+
+
+def test_bulk_changes_cap_filter_matches(
+    client: TestClient, test_user_token, many_books, monkeypatch
+):
+    """Test that a filter-only bulk change matching too many books is refused"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    monkeypatch.setattr("app.core.config.settings.BULK_CHANGE_MAX_ROWS", 2)
+    body = {"filter": {"published_from": "2023-01-03"}}
+    response = client.post("/books/bulk-delete", json=body, headers=headers)
+    assert response.status_code == 422
+    assert client.get("/books/", headers=headers).json()["total"] == 5
+
+    body["filter"]["published_from"] = "2023-01-04"
+    response = client.post(
+        "/books/bulk-update", json={**body, "patch": {"genre": "X"}}, headers=headers
+    )
+    assert response.json()["count"] == 2
+
+
+def test_bulk_import_invalid_utf8(client: TestClient, test_user_token):
+    """Test that rows that aren't valid UTF-8 are reported, not fatal"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    good = json.dumps({**TEST_BOOK, "title": "Caf\u00e9"}).encode()
+    body = b"\n".join([good, b'{"title": "\xff\xfe"}', good])
+    response = client.post(
+        "/books/bulk",
+        content=body,
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["errors"] == [{"row": 2, "errors": ["row: Not valid UTF-8"]}]
+
+    body = (
+        b"title,author,published_date,summary,genre\n"
+        b'Bad,Someone,2020-05-01,"Line one\n\xe9",\n'
+        b"Good,Someone,2020-05-01,,\n"
+    )
+    response = client.post(
+        "/books/bulk", content=body, headers={**headers, "Content-Type": "text/csv"}
+    )
+    data = response.json()
+    assert data["inserted"] == 1
+    assert data["errors"] == [{"row": 1, "errors": ["row: Not valid UTF-8"]}]
+
+
+def test_bulk_import_malformed_csv(client: TestClient, test_user_token, monkeypatch):
+    """Test that stray quotes and overlong lines only spoil their own rows"""
+    headers = {"Authorization": f"Bearer {test_user_token}", "Content-Type": "text/csv"}
+    monkeypatch.setattr("app.core.config.settings.BULK_IMPORT_MAX_LINE_BYTES", 100)
+    body = (
+        "title,author,published_date,summary,genre\n"
+        'A "quoted" word,Someone,2020-05-01,,\n'  # quotes inside a field
+        '"Never closed,Someone,2020-05-01,,\n'
+        + "Swallowed,Someone,2020-05-01,,\n" * 3
+        + "Carriage\rreturn,Someone,2020-05-01,,\n"
+        + "Long,Someone,2020-05-01,"
+        + "x" * 100
+        + ",\n"
+        "Good,Someone,2020-05-01,,\n"
+    )
+    response = client.post("/books/bulk", content=body.encode(), headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["errors"] == [
+        {"row": 2, "errors": ["row: Quoted field never closed"]},
+        {"row": 3, "errors": ["row: Malformed CSV record"]},
+        {"row": 4, "errors": ["row: Line longer than 100 bytes"]},
+    ]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_export_ndjson(client: TestClient, test_user_token, many_books, compress):
+    """Test that the export streams every book as NDJSON"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get("/books/export", params={"gzip": compress}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [book.id for book in many_books]
+    assert rows[0]["published_date"] == "2023-01-01"
+
+
+def test_export_csv(client: TestClient, test_user_token, many_books):
+    """Test that the CSV export has a header and one line per book"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get("/books/export?format=csv", headers=headers)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,title,author,published_date,summary,genre"
+    assert len(lines) == len(many_books) + 1
+
+
+def test_verified_tokens_are_cached(client: TestClient, test_user_token):
+    """Test that repeated requests with one token reuse the verified claims"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.get("/books/", headers=headers)
+    hits = token_cache.hits
+    client.get("/books/", headers=headers)
+    assert token_cache.hits == hits + 1
+
+
+def test_expired_token_rejected(client: TestClient, test_user):
+    """Test that an expired token is never accepted"""
+    token = create_access_token(
+        data={"sub": test_user.username}, expires_delta=timedelta(seconds=-1)
+    )
+    response = client.get("/books/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_get_book_conditional(client: TestClient, test_user_token, created_book):
+    """Test that a matching If-None-Match gets a bodiless 304"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    url = f"/books/{created_book.id}"
+    etag = client.get(url, headers=headers).headers["ETag"]
+
+    for _ in range(2):  # from the database, then from the cache
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        book_cache.clear()
+
+    client.patch(url, json={"title": "Renamed"}, headers=headers)
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_list_books_conditional(client: TestClient, test_user_token, many_books):
+    """Test that an unchanged list page gets a 304"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    etag = client.get("/books/", headers=headers).headers["ETag"]
+    response = client.get("/books/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    client.patch(f"/books/{many_books[0].id}", json={"genre": "New"}, headers=headers)
+    response = client.get("/books/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_update_book_if_match(client: TestClient, test_user_token, created_book):
+    """Test that PATCH and DELETE with a stale If-Match are refused"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    url = f"/books/{created_book.id}"
+    etag = client.get(url, headers=headers).headers["ETag"]
+
+    response = client.patch(
+        url, json={"title": "First"}, headers={**headers, "If-Match": etag}
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+
+    response = client.patch(
+        url, json={"title": "Second"}, headers={**headers, "If-Match": etag}
+    )
+    assert response.status_code == 412
+    response = client.delete(url, headers={**headers, "If-Match": etag})
+    assert response.status_code == 412
+
+    response = client.delete(url, headers={**headers, "If-Match": new_etag})
+    assert response.status_code == 204
+
+
+def test_update_book_rejects_null_required_fields(
+    client: TestClient, test_user_token, created_book
+):
+    """Test that PATCH can't clear a field every book must have"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    for field in ["title", "author", "published_date"]:
+        response = client.patch(
+            f"/books/{created_book.id}", json={field: None}, headers=headers
+        )
+        assert response.status_code == 422
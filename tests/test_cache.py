@@ -0,0 +1,53 @@
+import time
+
+from app.core.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert len(cache) == 1
+
+
+def test_lru_cache_disabled_when_size_is_zero():
+    cache = LRUCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_lru_cache_fill_loses_to_concurrent_write():
+    cache = LRUCache(maxsize=10)
+    before = cache.generation()
+    cache.set("updated", "new")
+    cache.delete("deleted")
+    cache.set_if_unchanged("updated", "old", before)
+    cache.set_if_unchanged("deleted", "old", before)
+    cache.set_if_unchanged("untouched", "value", before)
+    assert cache.get("updated") == "new"
+    assert cache.get("deleted") is None
+    assert cache.get("untouched") == "value"
+
+
+def test_lru_cache_fill_refused_once_writes_are_forgotten():
+    cache = LRUCache(maxsize=2)
+    before = cache.generation()
+    for key in "abc":
+        cache.set(key, 1)
+    cache.set_if_unchanged("a", "old", before)
+    assert cache.get("a") is None
@@ -0,0 +1,229 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.brokers import LocalBroker, UnixSocketBroker
+from app.core.events import DISCONNECT, DROP_OLDEST, EventManager
+
+
+def parse(frame):
+    """Split an SSE frame into its fields"""
+    return dict(line.split(": ", 1) for line in frame.strip().splitlines())
+
+
+async def receive(stream, count):
+    return [parse(await stream.__anext__())["data"] for _ in range(count)]
+
+
+def test_broadcast_reaches_every_subscriber():
+    async def run():
+        manager = EventManager()
+        streams = [manager.subscribe() for _ in range(3)]
+        pending = [asyncio.ensure_future(receive(s, 1)) for s in streams]
+        await asyncio.sleep(0)
+        await manager.broadcast("hello")
+        return await asyncio.gather(*pending)
+
+    assert asyncio.run(run()) == [["hello"]] * 3
+
+
+def test_slow_subscriber_drops_oldest():
+    async def run():
+        manager = EventManager(queue_size=2, overflow_policy=DROP_OLDEST)
+        stream = manager.subscribe()
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        for message in ["1", "2", "3", "4"]:
+            await manager.broadcast(message)
+        received = [parse(await first)["data"]] + await receive(stream, 1)
+        return received, manager.stats()
+
+    received, stats = asyncio.run(run())
+    assert received == ["3", "4"]
+    assert stats["dropped"] == 2
+
+
+def test_slow_subscriber_disconnected():
+    async def run():
+        manager = EventManager(queue_size=1, overflow_policy=DISCONNECT)
+        stream = manager.subscribe()
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        for message in ["1", "2", "3"]:
+            await manager.broadcast(message)
+        with pytest.raises(StopAsyncIteration):
+            await first
+        return manager.stats()
+
+    stats = asyncio.run(run())
+    assert stats["subscribers"] == 0
+    assert stats["disconnected"] == 1
+
+
+def test_idle_subscriber_gets_heartbeats():
+    async def run():
+        manager = EventManager(heartbeat_interval=0.01)
+        stream = manager.subscribe()
+        message = await stream.__anext__()
+        await stream.aclose()
+        return message, manager.stats()
+
+    message, stats = asyncio.run(run())
+    assert message == ": keep-alive\n\n"
+    assert stats["subscribers"] == 0
+
+
+def test_unix_socket_broker_reaches_every_worker(tmp_path):
+    large = "x" * 200_000  # Well past any datagram size
+
+    async def run():
+        workers = [
+            EventManager(broker=UnixSocketBroker(str(tmp_path), name=name))
+            for name in ("a", "b")
+        ]
+        for manager in workers:
+            await manager.start()
+        try:
+            streams = [manager.subscribe() for manager in workers]
+            pending = [asyncio.ensure_future(receive(s, 2)) for s in streams]
+            await asyncio.sleep(0.05)  # the workers find each other as they connect
+            await workers[0].broadcast("hello")
+            await workers[0].broadcast(large)
+            return await asyncio.wait_for(asyncio.gather(*pending), timeout=5)
+        finally:
+            for manager in workers:
+                await manager.stop()
+
+    assert asyncio.run(run()) == [["hello", large]] * 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unix_socket_broker_reconnects_to_restarted_worker(tmp_path):
+    async def run():
+        sender = EventManager(broker=UnixSocketBroker(str(tmp_path), name="a"))
+        receiver = EventManager(broker=UnixSocketBroker(str(tmp_path), name="b"))
+        await sender.start()
+        await receiver.start()
+        await sender.broadcast("before")
+        await receiver.stop()
+        await asyncio.sleep(0.01)
+
+        receiver = EventManager(broker=UnixSocketBroker(str(tmp_path), name="b"))
+        await receiver.start()
+        try:
+            stream = receiver.subscribe()
+            pending = asyncio.ensure_future(receive(stream, 1))
+            await asyncio.sleep(0.05)
+            await sender.broadcast("after")
+            return await asyncio.wait_for(pending, timeout=5)
+        finally:
+            await receiver.stop()
+            await sender.stop()
+
+    assert asyncio.run(run()) == ["after"]
+
+
+def test_unix_socket_broker_stalled_worker_delays_only_itself(tmp_path):
+    large = "x" * 1_000_000  # More than a stalled socket will buffer
+
+    async def run():
+        # A worker that accepts connections but never reads from them
+        stalled = await asyncio.start_unix_server(
+            lambda reader, writer: None, path=str(tmp_path / "stalled.sock")
+        )
+        workers = [
+            EventManager(broker=UnixSocketBroker(str(tmp_path), name=name))
+            for name in ("a", "b")
+        ]
+        for manager in workers:
+            await manager.start()
+        try:
+            stream = workers[1].subscribe()
+            pending = asyncio.ensure_future(receive(stream, 3))
+            await asyncio.sleep(0.05)
+            for _ in range(3):
+                await workers[0].broadcast(large)
+            return len(await asyncio.wait_for(pending, timeout=2))
+        finally:
+            for manager in workers:
+                await manager.stop()
+            stalled.close()
+
+    assert asyncio.run(run()) == 3
+
+
+def test_broker_failure_does_not_raise():
+    class FailingBroker(LocalBroker):
+        async def publish(self, message):
+            raise ConnectionError("broker is down")
+
+    async def run():
+        manager = EventManager(broker=FailingBroker())
+        await manager.broadcast("lost")
+
+    asyncio.run(run())
+
+
+def test_reconnect_replays_missed_events():
+    async def run():
+        manager = EventManager(replay_size=3)
+        stream = manager.subscribe()
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await manager.broadcast("1")
+        last_seen = parse(await first)["id"]
+        await stream.aclose()
+
+        for message in ["2", "3"]:
+            await manager.broadcast(message)
+        resumed = manager.subscribe(last_event_id=last_seen)
+        replayed = await receive(resumed, 2)
+        await resumed.aclose()
+
+        # After two more events "1" has aged out of the buffer
+        for message in ["4", "5"]:
+            await manager.broadcast(message)
+        stale = manager.subscribe(last_event_id=last_seen)
+        reset = json.loads(parse(await stale.__anext__())["data"])
+        await stale.aclose()
+        return replayed, reset
+
+    replayed, reset = asyncio.run(run())
+    assert replayed == ["2", "3"]
+    assert reset["event"] == "replay_unavailable"
+
+
+def test_changes_published_immediately_without_window():
+    async def run():
+        manager = EventManager()
+        stream = manager.subscribe()
+        pending = asyncio.ensure_future(receive(stream, 1))
+        await asyncio.sleep(0)
+        await manager.publish_change("book_deleted", 1, '{"id": 1}')
+        return json.loads((await pending)[0])
+
+    assert asyncio.run(run()) == {"event": "book_deleted", "data": {"id": 1}}
+
+
+def test_changes_coalesced_within_window():
+    async def run():
+        manager = EventManager(batch_window=0.01)
+        stream = manager.subscribe()
+        pending = asyncio.ensure_future(receive(stream, 1))
+        await asyncio.sleep(0)
+        await manager.publish_change("book_created", 1, '{"id": 1, "v": 1}')
+        await manager.publish_change("book_updated", 1, '{"id": 1, "v": 2}')
+        await manager.publish_change("book_updated", 2, '{"id": 2, "v": 1}')
+        await manager.publish_change("book_updated", 2, '{"id": 2, "v": 2}')
+        await manager.publish_change("book_updated", 3, '{"id": 3, "v": 1}')
+        await manager.publish_change("book_deleted", 3, '{"id": 3}')
+        return json.loads((await pending)[0])
+
+    frame = asyncio.run(run())
+    assert frame["event"] == "batch"
+    assert frame["data"] == [
+        {"event": "book_created", "data": {"id": 1, "v": 2}},
+        {"event": "book_updated", "data": {"id": 2, "v": 2}},
+        {"event": "book_deleted", "data": {"id": 3}},
+    ]
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+from tests.test_books import TEST_BOOK
+
+
+def test_server_timing_counts_queries(client: TestClient, test_user_token):
+    """Test that each response breaks down its time and database queries"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get("/books/", headers=headers)
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    assert 'desc="2 queries"' in timing
+
+
+def test_metrics_endpoint(client: TestClient, test_user_token):
+    """Test that /metrics exposes route latencies and component gauges"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.post("/books/", json=TEST_BOOK, headers=headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert (
+        'http_request_duration_seconds_count{method="POST",route="/books/",'
+        'status="200"}' in body
+    )
+    assert "db_query_duration_seconds_count" in body
+    assert "db_pool_checkout_duration_seconds_count" in body
+    assert "sse_subscribers 0" in body
+    assert "password_hash_queue_depth 0" in body
+
+
+def test_startup_time_recorded(client: TestClient):
+    """Test that the time to build and start the app is exported"""
+    body = client.get("/metrics").text
+    assert 'app_startup_seconds{phase="import"}' in body
+    assert 'app_startup_seconds{phase="ready"}' in body
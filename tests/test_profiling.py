@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core.metrics import RequestStats, instrument_engine, request_stats
+from app.database.profiling import QueryBudget, QueryBudgetExceeded, log_slow_queries
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    return engine
+
+
+def test_slow_query_logged_with_plan(engine, caplog):
+    log_slow_queries(engine, threshold_ms=0)
+    with caplog.at_level(logging.WARNING, logger="app.database.profiling"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM items WHERE name = :name"), {"name": "x"})
+    message = caplog.records[-1].getMessage()
+    assert "SELECT * FROM items WHERE name = ?" in message
+    assert "'x'" in message
+    assert "SCAN items" in message
+
+
+def test_fast_queries_not_logged(engine, caplog):
+    log_slow_queries(engine, threshold_ms=60_000)
+    with caplog.at_level(logging.WARNING, logger="app.database.profiling"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM items"))
+    assert caplog.records == []
+
+
+def test_query_budget(engine, monkeypatch):
+    instrument_engine(engine)
+    monkeypatch.setattr("app.core.config.settings.QUERY_BUDGET_STRICT", True)
+
+    async def run(budget):
+        token = request_stats.set(RequestStats())
+        try:
+            dependency = QueryBudget(budget)()
+            await dependency.__anext__()
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+            with pytest.raises(StopAsyncIteration):
+                await dependency.__anext__()
+        finally:
+            request_stats.reset(token)
+
+    asyncio.run(run(2))
+    with pytest.raises(QueryBudgetExceeded):
+        asyncio.run(run(1))
@@ -0,0 +1,98 @@
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.consistency import COOKIE_NAME
+from app.database.database import Base, pool_options
+from app.models.book import Book
+
+BOOK = {
+    "title": "Test Book",
+    "author": "Test Author",
+    "published_date": "2024-01-01",
+    "summary": "Test Summary",
+    "genre": "Test Genre",
+}
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """An empty second database standing in for a lagging read replica."""
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    Base.metadata.create_all(bind=create_engine(url))
+    replica_sessionmaker = async_sessionmaker(
+        create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1)),
+        expire_on_commit=False,
+    )
+    monkeypatch.setattr(
+        "app.database.database.get_replica_sessionmakers",
+        lambda: [replica_sessionmaker],
+    )
+    return replica_sessionmaker
+
+
+def test_reads_go_to_replica(client, test_user_token, db_session, replica):
+    """Reads without a recent write of the caller's own are served by a replica"""
+    db_session.add(Book(**{**BOOK, "published_date": date(2024, 1, 1)}))
+    db_session.commit()
+
+    response = client.get(
+        "/books/", headers={"Authorization": f"Bearer {test_user_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["total"] == 0
+
+
+def test_read_your_writes(client, test_user_token, replica, monkeypatch):
+    """A client reads from the primary for a while after its own write"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    monkeypatch.setattr("app.core.config.settings.READ_YOUR_WRITES_SECONDS", 0.2)
+    book_id = client.post("/books/", json=BOOK, headers=headers).json()["id"]
+
+    assert client.get("/books/", headers=headers).json()["total"] == 1
+    assert client.get(f"/books/{book_id}", headers=headers).status_code == 200
+
+    time.sleep(0.3)
+    assert client.get("/books/", headers=headers).json()["total"] == 0
+
+
+def test_read_your_writes_travels_with_the_client(client, test_user_token, replica):
+    """The write marker is a signed cookie, so any worker can honour it"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.post("/books/", json=BOOK, headers=headers)
+    marker = response.cookies[COOKIE_NAME]
+    client.cookies.clear()
+
+    # Without the cookie, as from another client, reads go to the replica
+    assert client.get("/books/", headers=headers).json()["total"] == 0
+    client.cookies.set(COOKIE_NAME, marker)
+    assert client.get("/books/", headers=headers).json()["total"] == 1
+    client.cookies.set(COOKIE_NAME, "9999999999.000.forged")
+    assert client.get("/books/", headers=headers).json()["total"] == 0
+
+
+def test_login_after_signup_reads_primary(client, replica):
+    """A user can log in right after signing up, before replicas catch up"""
+    response = client.post(
+        "/users/",
+        json={"username": "newuser", "email": "new@example.com", "password": "pw"},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/auth/login", json={"username": "newuser", "password": "pw"}
+    )
+    assert response.status_code == 200
+
+
+def test_pool_options_match_the_pool():
+    """Size and overflow settings are only passed to queue pools"""
+    assert set(pool_options("sqlite+aiosqlite:///./x.db")) == {
+        "pool_pre_ping",
+        "pool_recycle",
+    }
+    options = pool_options("postgresql+asyncpg://user@localhost/books")
+    assert {"pool_size", "max_overflow", "pool_timeout"} <= set(options)